@@ -0,0 +1,348 @@
+# This program aggregates statistics over logged Sequence games.
+# The input is one or more JSON lines files of game records, as saved by
+# sequence_tournament.py --records. Each file is split into byte-range shards that are
+# read line by line in chunks over a process pool, so memory use does not grow with the
+# number of games. It reports the advantage of each team in the turn order, win rates by
+# number of teams, jack usage, dead cards, and how often each tile is played on, with the
+# tile heatmaps drawn over the board layout.
+# Example: python sequence_analytics.py records.jsonl --heatmap heatmap.png
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sequence_engine import get_num_teams, get_max_sequences, is_one_eyed, is_two_eyed
+from sequence_layout import load_layout
+
+
+# User-defined functions
+
+def main():
+    # Aggregate the game records named on the command line and print the report.
+
+    args = parse_args()
+    shards = []
+    for path in args.files:
+        shards.extend(create_shards(path, args.shard_mb * 1024 * 1024))
+    stats = GameStats()
+    with ProcessPoolExecutor(args.workers) as executor:
+        for shard_stats in executor.map(analyze_shard, shards, [args.chunk] * len(shards)):
+            stats.merge(shard_stats)
+    report = stats.get_report()
+    print_report(report, args.layout)
+    if args.output is not None:
+        with open(args.output, 'w') as out_file:
+            json.dump(report, out_file, indent=2)
+    if args.heatmap is not None:
+        tiles = report['tiles'].get(load_layout(args.layout).ref)
+        if tiles is None:
+            print("No games on layout {}, no heatmap saved".format(args.layout))
+        else:
+            render_heatmap(args.layout, tiles['placed'], args.heatmap)
+
+
+def parse_args():
+    # Parse the command line arguments.
+    # returns - argparse.Namespace; the arguments
+
+    parser = argparse.ArgumentParser(description="Aggregate statistics over logged Sequence games.")
+    parser.add_argument('files', nargs='+', help="JSON lines files of game records")
+    parser.add_argument('--layout', default='board1', help="layout whose tile heatmaps are shown")
+    parser.add_argument('--output', default=None, help="JSON file to save the report to")
+    parser.add_argument('--heatmap', default=None, help="PNG file to draw the placement heatmap to")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk', type=int, default=1000, help="records read at a time")
+    parser.add_argument('--shard-mb', type=int, default=64, help="megabytes of a file read by one worker task")
+    return parser.parse_args()
+
+
+def create_shards(path, shard_size):
+    # Split a file into byte ranges of about a given size.
+    # path - str; the path of the file
+    # shard_size - int; the number of bytes in each shard
+    # returns - list; the (path, start, end) tuple of each shard
+
+    file_size = os.path.getsize(path)
+    shards = []
+    for start in range(0, file_size, shard_size):
+        shards.append((path, start, min(start + shard_size, file_size)))
+    return shards
+
+
+def read_chunks(shard, chunk_size):
+    # Read the records of a shard in chunks. A line belongs to the shard it starts in.
+    # shard - tuple; the path, start and end of the shard
+    # chunk_size - int; the number of records in each chunk
+    # yields - list; the dict records of each chunk
+
+    path, start, end = shard
+    with open(path, 'rb') as in_file:
+        if start > 0:
+            in_file.seek(start - 1)
+            in_file.readline()
+        chunk = []
+        while in_file.tell() < end:
+            line = in_file.readline()
+            if len(line) == 0:
+                break
+            if line.strip() != b'':
+                chunk.append(json.loads(line))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+
+def analyze_shard(shard, chunk_size):
+    # Aggregate the records of one shard. Runs in a worker process.
+    # shard - tuple; the path, start and end of the shard
+    # chunk_size - int; the number of records read at a time
+    # returns - GameStats; the statistics of the shard
+
+    stats = GameStats()
+    for chunk in read_chunks(shard, chunk_size):
+        for record in chunk:
+            stats.add(record)
+    return stats
+
+
+def get_rate(num, total):
+    # Return num / total, or 0.0 when total is 0.
+
+    if total == 0:
+        return 0.0
+    return num / total
+
+
+def print_report(report, layout):
+    # Print a report from GameStats.get_report.
+    # report - dict; the report
+    # layout - str; the name or path of the layout whose heatmaps are printed
+
+    print("{} games, {} moves".format(report['games'], report['moves']))
+    print()
+    print("{:<10}{:>8}{:>8}{:>10}{:>8}  {}".format("players", "teams", "games", "turns", "ties",
+                                                   "win rate by team in turn order"))
+    for num_players, stats in sorted(report['players'].items(), key=lambda item: int(item[0])):
+        rates = ' '.join("{:.3f}".format(rate) for rate in stats['win_rate'])
+        print("{:<10}{:>8}{:>8}{:>10.1f}{:>8}  {}".format(num_players, stats['teams'], stats['games'],
+                                                         stats['mean_turns'], stats['ties'], rates))
+    print()
+    print("{:<8}{:>10}{:>8}{:>14}{:>16}".format("teams", "sequences", "games", "first team", "expected"))
+    for num_teams, teams in sorted(report['teams'].items()):
+        print("{:<8}{:>10}{:>8}{:>14.3f}{:>16.3f}".format(num_teams, teams['max_sequences'], teams['games'],
+                                                         teams['first_team_win_rate'], 1 / int(num_teams)))
+    print()
+    jacks = report['jacks']
+    print("jacks: {:.1%} of moves ({:.1%} two-eyed, {:.1%} one-eyed); {:.1%} played by the winning team".format(
+        jacks['rate'], jacks['two_eyed_rate'], jacks['one_eyed_rate'], jacks['winner_share']))
+    print("by card: " + ', '.join("{} {}".format(card, num) for card, num in sorted(jacks['cards'].items())))
+    dead = report['dead_cards']
+    print("dead cards: {:.3f} per hand, {:.1%} of hands hold one or more".format(dead['mean'], dead['rate']))
+    print("hands by dead cards: " + ', '.join("{} {}".format(num, count)
+                                             for num, count in enumerate(dead['histogram'])))
+    tiles = report['tiles'].get(load_layout(layout).ref)
+    if tiles is not None:
+        print()
+        print("chips placed per game on {}:".format(layout))
+        print(format_heatmap(layout, tiles['placed'], tiles['games']))
+        print()
+        print("chips left at the end of a game (fraction of games) on {}:".format(layout))
+        print(format_heatmap(layout, tiles['final'], tiles['games']))
+
+
+def format_heatmap(layout, counts, num_games):
+    # Format per-tile counts as a grid over a layout, one row of the board per line.
+    # layout - str; the name or path of the layout
+    # counts - list; the int count of each cell
+    # num_games - int; the number of games the counts were taken over
+    # returns - str; the grid, with each tile's card ID and count per game
+
+    layout = load_layout(layout)
+    lines = []
+    for row_ind in range(layout.size):
+        cells = []
+        for col_ind in range(layout.size):
+            cell = row_ind * layout.size + col_ind
+            cells.append("{:>2} {:4.2f}".format(layout.cards[cell], get_rate(counts[cell], num_games)))
+        lines.append('  '.join(cells))
+    return '\n'.join(lines)
+
+
+def render_heatmap(layout, counts, path):
+    # Draw per-tile counts over the board layout as a PNG file, the busiest tile in full red.
+    # sequence_render is imported here so the analysis itself does not need pygame.
+    # layout - str; the name or path of the layout
+    # counts - list; the int count of each cell
+    # path - str; the path of the PNG file
+
+    import sequence_render
+    pygame = sequence_render.pygame
+    sequence_render.setup_worker()
+    board = sequence_render.get_board(layout)
+    surface = sequence_render.draw_position(board, [None] * len(counts))
+    view = board.tiles[0][0].view
+    most = max(max(counts), 1)
+    for cell, num in enumerate(counts):
+        shade = pygame.Surface(view.tile_size, pygame.SRCALPHA)
+        shade.fill((255, 0, 0, int(HEATMAP_ALPHA * num / most)))
+        surface.blit(shade, view.positions[cell])
+    pygame.image.save(surface, path)
+
+
+# User-defined classes
+
+class GameStats:
+    # This class accumulates statistics over game records. Its size depends only on the
+    # numbers of players and layouts seen, not on the number of games.
+
+    def __init__(self):
+        # Initialize GameStats with no games.
+        # self - GameStats; the GameStats to initialize
+
+        self.num_games = 0
+        self.num_moves = 0
+        self.players = {}
+        self.jack_cards = {}
+        self.winner_jacks = 0
+        self.dead_histogram = []
+        self.tiles = {}
+
+    def add(self, record):
+        # Add one game record.
+        # self - GameStats; the GameStats object
+        # record - dict; a game record from GameState.get_record
+
+        num_players = record['num_players']
+        num_teams = get_num_teams(num_players)
+        winner = record['winner']
+        moves = record['moves']
+        self.num_games += 1
+        self.num_moves += len(moves)
+        players = self.players.get(num_players)
+        if players is None:
+            players = {'games': 0, 'turns': 0, 'ties': 0, 'wins': [0] * num_teams}
+            self.players[num_players] = players
+        players['games'] += 1
+        players['turns'] += len(moves)
+        if winner is None:
+            players['ties'] += 1
+        else:
+            players['wins'][winner] += 1
+        tiles = self.tiles.get(record['layout'])
+        if tiles is None:
+            num_cells = len(load_layout(record['layout']).cards)
+            tiles = {'games': 0, 'placed': [0] * num_cells, 'removed': [0] * num_cells, 'final': [0] * num_cells}
+            self.tiles[record['layout']] = tiles
+        tiles['games'] += 1
+        placed = tiles['placed']
+        removed = tiles['removed']
+        chips = {}
+        for turn_num, (card, cell, dead) in enumerate(moves):
+            team = turn_num % num_teams
+            if is_one_eyed(card):
+                removed[cell] += 1
+                del chips[cell]
+            else:
+                placed[cell] += 1
+                chips[cell] = team
+            if card[0] == 'J':
+                self.jack_cards[card] = self.jack_cards.get(card, 0) + 1
+                if team == winner:
+                    self.winner_jacks += 1
+            while len(self.dead_histogram) <= dead:
+                self.dead_histogram.append(0)
+            self.dead_histogram[dead] += 1
+        final = tiles['final']
+        for cell in chips:
+            final[cell] += 1
+
+    def merge(self, other):
+        # Add the statistics of another GameStats to this one.
+        # self - GameStats; the GameStats object
+        # other - GameStats; the GameStats to add
+
+        self.num_games += other.num_games
+        self.num_moves += other.num_moves
+        for num_players, other_players in other.players.items():
+            players = self.players.get(num_players)
+            if players is None:
+                self.players[num_players] = other_players
+            else:
+                for key in ('games', 'turns', 'ties'):
+                    players[key] += other_players[key]
+                players['wins'] = [num + other_num
+                                   for num, other_num in zip(players['wins'], other_players['wins'])]
+        for card, num in other.jack_cards.items():
+            self.jack_cards[card] = self.jack_cards.get(card, 0) + num
+        self.winner_jacks += other.winner_jacks
+        while len(self.dead_histogram) < len(other.dead_histogram):
+            self.dead_histogram.append(0)
+        for dead, num in enumerate(other.dead_histogram):
+            self.dead_histogram[dead] += num
+        for layout, other_tiles in other.tiles.items():
+            tiles = self.tiles.get(layout)
+            if tiles is None:
+                self.tiles[layout] = other_tiles
+            else:
+                tiles['games'] += other_tiles['games']
+                for key in ('placed', 'removed', 'final'):
+                    tiles[key] = [num + other_num for num, other_num in zip(tiles[key], other_tiles[key])]
+
+    def get_report(self):
+        # Return the statistics as a dict that can be saved as JSON.
+        # self - GameStats; the GameStats object
+        # returns - dict; the report
+
+        players = {}
+        teams = {}
+        for num_players, stats in self.players.items():
+            players[num_players] = {
+                'teams': len(stats['wins']),
+                'games': stats['games'],
+                'ties': stats['ties'],
+                'mean_turns': get_rate(stats['turns'], stats['games']),
+                'wins': stats['wins'],
+                'win_rate': [get_rate(num, stats['games']) for num in stats['wins']]
+            }
+            num_teams = len(stats['wins'])
+            team_stats = teams.setdefault(num_teams, {'games': 0, 'ties': 0, 'wins': [0] * num_teams})
+            team_stats['games'] += stats['games']
+            team_stats['ties'] += stats['ties']
+            team_stats['wins'] = [num + other_num for num, other_num in zip(team_stats['wins'], stats['wins'])]
+        for num_teams, stats in teams.items():
+            stats['max_sequences'] = get_max_sequences(num_teams)
+            stats['win_rate'] = [get_rate(num, stats['games']) for num in stats['wins']]
+            stats['first_team_win_rate'] = stats['win_rate'][0]
+        num_jacks = sum(self.jack_cards.values())
+        num_two_eyed = sum(num for card, num in self.jack_cards.items() if is_two_eyed(card))
+        num_hands = sum(self.dead_histogram)
+        num_dead = sum(dead * num for dead, num in enumerate(self.dead_histogram))
+        return {
+            'games': self.num_games,
+            'moves': self.num_moves,
+            'players': players,
+            'teams': teams,
+            'jacks': {
+                'cards': dict(self.jack_cards),
+                'rate': get_rate(num_jacks, self.num_moves),
+                'two_eyed_rate': get_rate(num_two_eyed, self.num_moves),
+                'one_eyed_rate': get_rate(num_jacks - num_two_eyed, self.num_moves),
+                'winner_share': get_rate(self.winner_jacks, num_jacks)
+            },
+            'dead_cards': {
+                'histogram': list(self.dead_histogram),
+                'mean': get_rate(num_dead, num_hands),
+                'rate': get_rate(num_hands - (self.dead_histogram[0] if num_hands > 0 else 0), num_hands)
+            },
+            'tiles': self.tiles
+        }
+
+
+# The opacity of the busiest tile in the heatmap image, out of 255.
+HEATMAP_ALPHA = 200
+
+
+if __name__ == '__main__':
+    main()
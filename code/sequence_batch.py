@@ -0,0 +1,385 @@
+# This module plays many games of Sequence in lockstep with NumPy.
+# A BatchState holds the decks, hands and chips of K games as arrays. All K decks are
+# shuffled with one vectorized permutation and dealt with one slice, and every step
+# plays one move in each game that is not over, with legal moves, removals and
+# sequences computed for all games at once. It follows the same rules as GameState and
+# can return engine game records, so batched games can be replayed, rendered and
+# analyzed like any other. It is the fast path for generating self-play data.
+# Example: python sequence_batch.py --games 1024
+
+import argparse
+import time
+import numpy as np
+from sequence_engine import get_num_teams, get_num_cards, get_max_sequences, is_one_eyed, is_two_eyed
+from sequence_layout import load_layout, get_card_ids, CARD_IDS, SEQUENCE_LENGTH
+
+
+# User-defined functions
+
+def main():
+    # Play random batched games and print the number of moves per second.
+
+    parser = argparse.ArgumentParser(description="Play random Sequence games in lockstep with NumPy.")
+    parser.add_argument('--games', type=int, default=1024, help="games played at once")
+    parser.add_argument('--players', type=int, default=2, help="number of players")
+    parser.add_argument('--layout', default='board1', help="board layout name or path")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the batch")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    state = BatchState(args.games, args.players, args.layout, args.seed, record=False)
+    num_moves = state.play_random()
+    elapsed = time.perf_counter() - start
+    print("{} games, {} moves in {:.2f} s ({:.0f} moves per second)".format(
+        args.games, num_moves, elapsed, num_moves / elapsed))
+
+
+def get_tables(layout):
+    # Return the NumPy lookup tables of a layout, creating them on first use.
+    # layout - Layout; the compiled layout
+    # returns - dict; the tables used by BatchState
+
+    tables = batch_tables.get(layout)
+    if tables is None:
+        num_cells = len(layout.cards)
+        num_lines = len(layout.lines)
+        length = max(len(line) for line in layout.lines)
+        # Lines are padded with the index num_cells, a cell that is never owned or empty.
+        line_cells = np.full((num_lines, length), num_cells, dtype=np.intp)
+        # The flattened line positions of each cell, padded with a position past the last line.
+        cell_positions = np.full((num_cells, 4), num_lines * length, dtype=np.intp)
+        num_positions = [0] * num_cells
+        for line_ind, line in enumerate(layout.lines):
+            for position, cell in enumerate(line):
+                line_cells[line_ind, position] = cell
+                cell_positions[cell, num_positions[cell]] = line_ind * length + position
+                num_positions[cell] += 1
+        # The cells in each of the 8 directions from each cell, nearest first, padded so
+        # every ray ends with at least one padding cell.
+        cell_rays = np.full((num_cells, len(RAY_DIRECTIONS), layout.size), num_cells, dtype=np.intp)
+        for cell in range(num_cells):
+            for ray_ind, (row_step, col_step) in enumerate(RAY_DIRECTIONS):
+                row_ind = cell // layout.size + row_step
+                col_ind = cell % layout.size + col_step
+                distance = 0
+                while 0 <= row_ind < layout.size and 0 <= col_ind < layout.size:
+                    cell_rays[cell, ray_ind, distance] = row_ind * layout.size + col_ind
+                    row_ind += row_step
+                    col_ind += col_step
+                    distance += 1
+        # Card codes run from 1 to len(CARD_IDS) - 1; EMPTY_CARD marks an empty hand slot.
+        # The cells of jacks and empty slots are all padding.
+        card_cells = np.full((EMPTY_CARD + 1, layout.copies), num_cells, dtype=np.intp)
+        for card, cells in layout.card_cells.items():
+            if card != 'W':
+                card_cells[CARD_IDS.index(card)] = cells
+        tables = {
+            'wild': np.append(np.asarray(layout.wild, dtype=bool), False),
+            'line_cells': line_cells,
+            'cell_positions': cell_positions,
+            'cell_rays': cell_rays,
+            'sequences': get_sequences(np.arange(2 * layout.size)),
+            'card_cells': card_cells,
+            'deck': np.array([CARD_IDS.index(card) for card in get_card_ids()] * layout.copies, dtype=np.int16)
+        }
+        batch_tables[layout] = tables
+    return tables
+
+
+def get_runs(lines):
+    # Return the length of the run of owned cells ending at each line position, from either end.
+    # lines - numpy.ndarray; (games, lines, length) bool of the line positions a team owns
+    # returns - tuple; the runs from the left and the runs from the right
+
+    positions = np.arange(lines.shape[-1], dtype=np.int16)
+    left = positions - np.maximum.accumulate(np.where(lines, np.int16(-1), positions), axis=-1)
+    flipped = lines[..., ::-1]
+    right = positions - np.maximum.accumulate(np.where(flipped, np.int16(-1), positions), axis=-1)
+    return left, right[..., ::-1]
+
+
+def get_sequences(run):
+    # Return the sequences counted for runs of given lengths: one at 5 and another at 10.
+    # run - numpy.ndarray; the int run lengths
+
+    return (run >= SEQUENCE_LENGTH).astype(np.int16) + (run >= 2 * SEQUENCE_LENGTH)
+
+
+def get_removal_changes(owned, line_cells, cell_positions):
+    # Return the change in a team's sequences if the chip on each cell were removed.
+    # A run split by the removal counts its two parts instead, along every line through the cell.
+    # owned - numpy.ndarray; (games, cells + 1) bool of the cells a team owns, the last always False
+    # line_cells - numpy.ndarray; (lines, length) cell index of each line position
+    # cell_positions - numpy.ndarray; (cells, 4) flattened line positions of each cell
+    # returns - numpy.ndarray; (games, cells) the change for each cell
+
+    lines = owned[:, line_cells]
+    left, right = get_runs(lines)
+    changes = get_sequences(left - 1) + get_sequences(right - 1) - get_sequences(left + right - 1)
+    changes = np.where(lines, changes, 0).reshape(len(owned), -1)
+    changes = np.concatenate([changes, np.zeros((len(owned), 1), dtype=changes.dtype)], axis=1)
+    return changes[:, cell_positions].sum(axis=-1)
+
+
+def get_placement_changes(rays, sequences):
+    # Return the change in a team's sequences when it places a chip on a cell it does not own.
+    # The chip joins the runs on either side of it along each line through the cell, which
+    # changes the team's sequences the same as count_sequences_at in the engine.
+    # rays - numpy.ndarray; (games, 8, length) bool of the cells the team owns along each ray
+    #   from the cell, in the order of RAY_DIRECTIONS and ending with an unowned padding cell
+    # sequences - numpy.ndarray; the sequences counted for each run length, from get_sequences
+    # returns - numpy.ndarray; (games,) the change in each game
+
+    runs = (~rays).argmax(axis=-1)
+    before = sequences[runs[:, 0::2]] + sequences[runs[:, 1::2]]
+    after = sequences[runs[:, 0::2] + runs[:, 1::2] + 1]
+    return (after - before).sum(axis=1)
+
+
+# User-defined classes
+
+class BatchState:
+    # This class represents K games of Sequence played in lockstep.
+    # Cards are int codes into CARD_IDS, chips are the int8 team index or -1, and a move
+    # in each game is the hand slot of the card played and the cell played on. Every game
+    # is on the same turn number, so the seat and team to move are shared by the batch.
+    # Legal moves are kept as the number of moves for each card in hand, and the cells
+    # each kind of card can be played on, rather than one flag per card and cell. Arrays
+    # of cells have an extra last column, the padding cell of the line tables, which is
+    # never empty, owned or removable.
+
+    def __init__(self, num_games, num_players=2, layout='board1', seed=None, record=True):
+        # Initialize a BatchState, shuffling and dealing every game at once.
+        # self - BatchState; the BatchState to initialize
+        # num_games - int; the number of games K
+        # num_players - int; the number of players, a key of NUM_CARDS
+        # layout - str; the name or path of the board layout
+        # seed - int; the seed of the batch, or None
+        # record - bool; True to keep the moves for get_records
+
+        if get_num_cards(num_players) is None:
+            raise ValueError("Unsupported number of players: {}".format(num_players))
+        self.layout = load_layout(layout)
+        self.tables = get_tables(self.layout)
+        self.num_games = num_games
+        self.num_players = num_players
+        self.num_teams = get_num_teams(num_players)
+        self.num_cards = get_num_cards(num_players)
+        self.max_sequences = get_max_sequences(self.num_teams)
+        self.rng = np.random.default_rng(seed)
+        self.deck = self.rng.permuted(np.tile(self.tables['deck'], (num_games, 1)), axis=1)
+        self.hands = self.setup_hands()
+        self.chips = np.full((num_games, len(self.layout.cards) + 1), -1, dtype=np.int8)
+        self.chips[:, -1] = PADDING_CHIP
+        self.num_sequences = np.zeros((num_games, self.num_teams), dtype=np.int16)
+        self.num_chips = np.zeros((num_games, self.num_teams), dtype=np.int16)
+        self.num_open = np.full(num_games, np.count_nonzero(~self.tables['wild'][:-1]), dtype=np.int16)
+        self.turn_num = 0
+        self.winner = np.full(num_games, -1, dtype=np.int8)
+        self.is_over = np.zeros(num_games, dtype=bool)
+        self.history = [] if record else None
+        self.rows = np.arange(num_games)
+        self.update_legal()
+
+    def setup_hands(self):
+        # Deal every hand of every game from the end of the decks, in the same order as GameState.
+        # self - BatchState; the BatchState object
+        # returns - numpy.ndarray; (games, players, cards) the card codes of each hand
+
+        num_dealt = self.num_players * self.num_cards
+        self.deck_size = np.full(self.num_games, self.deck.shape[1] - num_dealt, dtype=np.intp)
+        dealt = self.deck[:, ::-1][:, :num_dealt]
+        return dealt.reshape(self.num_games, self.num_cards, self.num_players).transpose(0, 2, 1).copy()
+
+    def get_owned(self, games, team):
+        # Return the cells a team owns in some games, counting the wild corners.
+        # self - BatchState; the BatchState object
+        # games - numpy.ndarray; the game indices
+        # team - int; the team index
+        # returns - numpy.ndarray; (games, cells + 1) bool, the last column False
+
+        return (self.chips[games] == team) | self.tables['wild']
+
+    def update_legal(self):
+        # Count the legal moves of each card in the hands of the player to move, and end the
+        # games where there are none.
+        # self - BatchState; the BatchState object
+
+        tables = self.tables
+        team = self.turn_num % self.num_teams
+        hands = self.hands[:, self.turn_num % self.num_players]
+        one_eyed = ONE_EYED[hands]
+        self.empty = self.chips == -1
+        self.protected = np.zeros(self.chips.shape, dtype=bool)
+        num_removable = self.num_chips.sum(axis=1) - self.num_chips[:, team]
+        has_one_eyed = one_eyed.any(axis=1)
+        for other in range(self.num_teams):
+            # Only chips of a team with a sequence can be protected, so removals are only
+            # checked in the games where the player holds a one-eyed jack to play on them.
+            games = np.flatnonzero(has_one_eyed & (self.num_sequences[:, other] > 0))
+            if other != team and len(games) > 0:
+                changes = get_removal_changes(self.get_owned(games, other), tables['line_cells'],
+                                              tables['cell_positions'])
+                protected = (self.chips[games, :-1] == other) & (changes < 0)
+                self.protected[games, :-1] |= protected
+                num_removable[games] -= np.count_nonzero(protected, axis=1)
+        flat_cells = tables['card_cells'][hands] + (self.rows * self.chips.shape[1])[:, None, None]
+        self.card_open = np.take(self.empty, flat_cells)
+        counts = self.card_open[..., 0].astype(np.int16)
+        for copy in range(1, self.layout.copies):
+            counts += self.card_open[..., copy]
+        counts = np.where(TWO_EYED[hands], self.num_open[:, None], counts)
+        counts = np.where(one_eyed, num_removable[:, None], counts)
+        counts[self.is_over] = 0
+        self.is_over |= ~counts.any(axis=1)
+        self.move_counts = counts
+
+    def get_open_cells(self, games):
+        # Return the cells a two-eyed jack can be played on in some games.
+        # self - BatchState; the BatchState object
+        # games - numpy.ndarray; the game indices
+        # returns - numpy.ndarray; (games, cells + 1) bool
+
+        return self.empty[games] & ~self.tables['wild']
+
+    def get_removable(self, games):
+        # Return the cells a one-eyed jack can be played on in some games.
+        # self - BatchState; the BatchState object
+        # games - numpy.ndarray; the game indices
+        # returns - numpy.ndarray; (games, cells + 1) bool
+
+        chips = self.chips[games]
+        return (chips >= 0) & (chips != self.turn_num % self.num_teams) & ~self.protected[games]
+
+    def get_legal_mask(self):
+        # Return every legal move of the player to move, for policies that score all of them.
+        # self - BatchState; the BatchState object
+        # returns - numpy.ndarray; (games, cards, cells) True where the card in a slot can be played on a cell
+
+        hands = self.hands[:, self.turn_num % self.num_players]
+        legal = np.zeros((self.num_games, self.num_cards, self.chips.shape[1]), dtype=bool)
+        cells = self.tables['card_cells'][hands]
+        legal[self.rows[:, None, None], np.arange(self.num_cards)[None, :, None], cells] = self.card_open
+        legal |= TWO_EYED[hands][:, :, None] & self.get_open_cells(self.rows)[:, None, :]
+        legal |= ONE_EYED[hands][:, :, None] & self.get_removable(self.rows)[:, None, :]
+        legal[self.is_over] = False
+        return legal[..., :-1]
+
+    def sample_moves(self):
+        # Choose a uniformly random legal move in every game: a card with probability in
+        # proportion to its number of moves, then one of its cells.
+        # self - BatchState; the BatchState object
+        # returns - tuple; (games,) the hand slots and (games,) the cells, arbitrary in games that are over
+
+        totals = self.move_counts.cumsum(axis=1)
+        picks = (self.rng.random(self.num_games) * totals[:, -1]).astype(totals.dtype)
+        slots = (totals > picks[:, None]).argmax(axis=1)
+        cards = self.hands[self.rows, self.turn_num % self.num_players, slots]
+        # Adding the flags to numbers in [0, 1) makes argmax pick a random flagged entry.
+        card_cells = self.tables['card_cells'][cards]
+        card_open = self.card_open[self.rows, slots]
+        choices = (self.rng.random(card_open.shape) + card_open).argmax(axis=1)
+        cells = card_cells[self.rows, choices]
+        jacks = np.flatnonzero((TWO_EYED[cards] | ONE_EYED[cards]) & ~self.is_over)
+        if len(jacks) > 0:
+            flags = np.where(TWO_EYED[cards[jacks]][:, None], self.get_open_cells(jacks), self.get_removable(jacks))
+            cells[jacks] = (self.rng.random(flags.shape) + flags).argmax(axis=1)
+        return slots, cells
+
+    def count_dead_cards(self, games):
+        # Count the non-jack cards in the hands of the player to move whose Tiles are all taken.
+        # self - BatchState; the BatchState object
+        # games - numpy.ndarray; the game indices
+        # returns - numpy.ndarray; the number of dead cards in each game
+
+        hands = self.hands[games, self.turn_num % self.num_players]
+        return (PLAIN[hands] & ~self.card_open[games].any(axis=-1)).sum(axis=1)
+
+    def step(self, slots, cells):
+        # Play one move in every game that is not over, draw new cards and check for a winner.
+        # The moves must be legal, such as those from sample_moves.
+        # self - BatchState; the BatchState object
+        # slots - numpy.ndarray; (games,) the hand slot of the card played in each game
+        # cells - numpy.ndarray; (games,) the cell played on in each game
+
+        tables = self.tables
+        seat = self.turn_num % self.num_players
+        team = self.turn_num % self.num_teams
+        games = np.flatnonzero(~self.is_over)
+        slots = slots[games]
+        cells = cells[games]
+        cards = self.hands[games, seat, slots]
+        if self.history is not None:
+            self.history.append((games, cards, cells, self.count_dead_cards(games)))
+        is_removal = ONE_EYED[cards]
+        removed = games[is_removal]
+        removed_cells = cells[is_removal]
+        self.num_chips[removed, self.chips[removed, removed_cells]] -= 1
+        self.num_open[removed] += 1
+        self.chips[removed, removed_cells] = -1
+        placed = games[~is_removal]
+        placed_cells = cells[~is_removal]
+        ray_cells = tables['cell_rays'][placed_cells]
+        rays = (self.chips[placed[:, None, None], ray_cells] == team) | tables['wild'][ray_cells]
+        self.chips[placed, placed_cells] = team
+        self.num_chips[placed, team] += 1
+        self.num_open[placed] -= 1
+        self.num_sequences[placed, team] += get_placement_changes(rays, tables['sequences'])
+        deck_size = self.deck_size[games]
+        has_card = deck_size > 0
+        drawn = self.deck[games, np.maximum(deck_size - 1, 0)]
+        self.hands[games, seat, slots] = np.where(has_card, drawn, EMPTY_CARD)
+        self.deck_size[games] -= has_card
+        winners = placed[self.num_sequences[placed, team] >= self.max_sequences]
+        self.winner[winners] = team
+        self.is_over[winners] = True
+        self.turn_num += 1
+        self.update_legal()
+
+    def play_random(self):
+        # Play random legal moves until every game is over.
+        # self - BatchState; the BatchState object
+        # returns - int; the number of moves played
+
+        num_moves = 0
+        while not self.is_over.all():
+            num_moves += int((~self.is_over).sum())
+            self.step(*self.sample_moves())
+        return num_moves
+
+    def get_records(self):
+        # Return the game records of the batch, the same as GameState.get_record.
+        # self - BatchState; the BatchState object, created with record=True
+        # returns - list; the dict record of each game
+
+        moves = [[] for _ in range(self.num_games)]
+        for games, cards, cells, dead in self.history:
+            for game, card, cell, num in zip(games.tolist(), cards.tolist(), cells.tolist(), dead.tolist()):
+                moves[game].append([CARD_IDS[card], cell, num])
+        records = []
+        for game in range(self.num_games):
+            records.append({
+                'layout': self.layout.ref,
+                'num_players': self.num_players,
+                'seed': None,
+                'moves': moves[game],
+                'winner': None if self.winner[game] < 0 else int(self.winner[game])
+            })
+        return records
+
+
+# The row and column steps of the rays from a cell, each direction followed by its opposite.
+RAY_DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+# The code of an empty hand slot, after the last card code.
+EMPTY_CARD = len(CARD_IDS)
+# The chip on the padding cell, which is not a team and not empty.
+PADDING_CHIP = -2
+# Whether each card code, and EMPTY_CARD, is a two-eyed jack, a one-eyed jack or a card shown on the board.
+TWO_EYED = np.array([is_two_eyed(card) for card in CARD_IDS] + [False])
+ONE_EYED = np.array([is_one_eyed(card) for card in CARD_IDS] + [False])
+PLAIN = np.array([card != 'W' and card[0] != 'J' for card in CARD_IDS] + [False])
+# NumPy lookup tables by compiled Layout, since layouts from different files can share a name.
+batch_tables = {}
+
+
+if __name__ == '__main__':
+    main()
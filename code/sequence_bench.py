@@ -0,0 +1,433 @@
+# This program benchmarks the hot paths of the Sequence engine and renderer.
+# The renderer is benchmarked with the dummy SDL video driver, so no window is opened.
+# Results are saved to JSON so runs can be compared across commits; with --compare,
+# any benchmark slower than the baseline by more than the threshold is flagged and the
+# program exits with status 1.
+# Example: python sequence_bench.py --output new.json --compare baseline.json
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import pygame
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import sequence_main
+from sequence_engine import GameState, NUM_CARDS
+from sequence_bots import create_bot
+
+
+# User-defined functions
+
+def main():
+    # Run the benchmarks selected on the command line and save or compare the results.
+
+    args = parse_args()
+    os.chdir(CODE_DIR)
+    results = run_benchmarks(args.filter, args.min_time, args.repeat)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': results
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as out_file:
+            json.dump(report, out_file, indent=2)
+    if args.compare is not None:
+        with open(args.compare, 'r') as in_file:
+            baseline = json.load(in_file)
+        regressions = compare_results(baseline['benchmarks'], results, args.threshold)
+        if len(regressions) > 0:
+            print("Regressions: {}".format(', '.join(regressions)))
+            sys.exit(1)
+
+
+def parse_args():
+    # Parse the command line arguments.
+    # returns - argparse.Namespace; the arguments
+
+    parser = argparse.ArgumentParser(description="Benchmark the Sequence engine and renderer.")
+    parser.add_argument('--output', default=None, help="JSON file to save the results to")
+    parser.add_argument('--compare', default=None, help="JSON results of a previous run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="slowdown of the best time that counts as a regression (default: 0.1)")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this text")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimum seconds per timing sample")
+    parser.add_argument('--repeat', type=int, default=5, help="timing samples per benchmark")
+    return parser.parse_args()
+
+
+def get_commit():
+    # Return the git commit of the code being benchmarked, or None outside a git checkout.
+
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CODE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip()
+
+
+def run_benchmarks(name_filter, min_time, repeat):
+    # Run the benchmarks and print the time of each call.
+    # name_filter - str; only benchmarks whose name contains this text are run
+    # min_time - float; the minimum seconds per timing sample
+    # repeat - int; the number of timing samples
+    # returns - dict; the summary of each benchmark by name, leaving out the benchmarks skipped
+
+    results = {}
+    print("{:<32}{:>14}{:>14}{:>14}".format("benchmark", "best", "median", "per second"))
+    for name, benchmark in BENCHMARKS:
+        if name_filter in name:
+            samples = benchmark(min_time, repeat)
+            if samples is None:
+                print("{:<32}{:>14}".format(name, "skipped"))
+                continue
+            results[name] = summarize(samples)
+            print("{:<32}{:>14}{:>14}{:>14.1f}".format(name, format_time(results[name]['best']),
+                                                       format_time(results[name]['median']),
+                                                       results[name]['per_second']))
+    return results
+
+
+def summarize(samples):
+    # Summarize the seconds per call of the timing samples.
+    # samples - list; the float seconds per call of each sample
+    # returns - dict; the best, median and mean seconds and the calls per second
+
+    median = statistics.median(samples)
+    return {
+        'best': min(samples),
+        'median': median,
+        'mean': statistics.mean(samples),
+        'samples': len(samples),
+        'per_second': 1 / median
+    }
+
+
+def compare_results(baseline, results, threshold):
+    # Print the change of each benchmark from the baseline and return the regressions.
+    # baseline - dict; the summaries of a previous run
+    # results - dict; the summaries of this run
+    # threshold - float; the slowdown of the best time that counts as a regression
+    # returns - list; the str names of the regressed benchmarks
+
+    regressions = []
+    print()
+    print("{:<32}{:>14}{:>14}{:>10}".format("benchmark", "baseline", "now", "change"))
+    for name in results:
+        if name in baseline:
+            old = baseline[name]['best']
+            new = results[name]['best']
+            change = new / old - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            print("{:<32}{:>14}{:>14}{:>+10.1%}{}".format(name, format_time(old), format_time(new), change, flag))
+    return regressions
+
+
+def format_time(seconds):
+    # Format a duration with a readable unit.
+    # seconds - float; the duration
+    # returns - str; the formatted duration
+
+    if seconds < 1e-3:
+        return "{:.2f} us".format(seconds * 1e6)
+    elif seconds < 1:
+        return "{:.2f} ms".format(seconds * 1e3)
+    return "{:.2f} s".format(seconds)
+
+
+def time_calls(func, min_time, repeat):
+    # Time a function, calling it enough times per sample to fill the minimum sample time.
+    # func - function; the function to time, taking no arguments
+    # min_time - float; the minimum seconds per timing sample
+    # repeat - int; the number of timing samples
+    # returns - list; the float seconds per call of each sample
+
+    timer = timeit.Timer(func)
+    number = 1
+    elapsed = timer.timeit(number)
+    while elapsed < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+        elapsed = timer.timeit(number)
+    return [elapsed / number for elapsed in timer.repeat(repeat, number)]
+
+
+def create_game(num_players=2):
+    # Create a Game on a dummy display, the same size as the window main() opens.
+    # num_players - int; the number of players
+    # returns - Game; the Game
+
+    random.seed(0)
+    pygame.init()
+    surface = pygame.display.set_mode((1920, 1020))
+    game = sequence_main.Game(surface, num_players=num_players)
+    game.images_dict.load_all()
+    return game
+
+
+def fill_board(board, fraction, seed):
+    # Place chips of random colors on a fraction of the Tiles of a Board.
+    # board - Board; the Board to fill
+    # fraction - float; the fraction of the Tiles to cover
+    # seed - int; the seed of the random placement
+
+    rng = random.Random(seed)
+    for row in board.tiles:
+        for tile in row:
+            tile.color = None
+            if rng.random() < fraction:
+                tile.color = rng.choice(['blue', 'green'])
+
+
+def create_states(num_players, num_moves, count):
+    # Create game states a number of random moves into their games.
+    # num_players - int; the number of players
+    # num_moves - int; the number of moves to play
+    # count - int; the number of states
+    # returns - list; the GameStates
+
+    states = []
+    seed = 0
+    while len(states) < count:
+        state = GameState(num_players, seed=seed)
+        bot = create_bot('random', seed)
+        while not state.is_over and state.turn_num < num_moves:
+            state.play(bot.choose(state))
+        if not state.is_over:
+            states.append(state)
+        seed += 1
+    return states
+
+
+def bench_check_sequences(fraction):
+    # Create a benchmark of Board.check_sequences on a board with a fraction of the Tiles covered.
+    # fraction - float; the fraction of the Tiles covered
+    # returns - function; the benchmark
+
+    def benchmark(min_time, repeat):
+        board = create_game().board
+        fill_board(board, fraction, 0)
+        return time_calls(lambda: board.check_sequences('blue'), min_time, repeat)
+    return benchmark
+
+
+def bench_legal_moves(min_time, repeat):
+    # Benchmark move generation on mid-game states.
+
+    states = create_states(2, 40, 16)
+    ind = [0]
+
+    def generate():
+        ind[0] = (ind[0] + 1) % len(states)
+        states[ind[0]].get_legal_moves()
+    return time_calls(generate, min_time, repeat)
+
+
+def bench_select(min_time, repeat):
+    # Benchmark Board.select on the centre of every Tile in turn, with a hand that cannot play.
+
+    board = create_game().board
+    positions = [tile.view.rects[tile.index].center for row in board.tiles for tile in row]
+    ind = [0]
+
+    def select():
+        ind[0] = (ind[0] + 1) % len(positions)
+        board.select(positions[ind[0]], 'blue', [])
+    return time_calls(select, min_time, repeat)
+
+
+def bench_draw(min_time, repeat):
+    # Benchmark a full Game.draw of a mid-game board.
+
+    game = create_game()
+    fill_board(game.board, 0.4, 0)
+    game.is_ready = True
+    return time_calls(game.draw, min_time, repeat)
+
+
+def bench_startup(min_time, repeat):
+    # Benchmark the time from starting a new interpreter to the first frame drawn.
+
+    samples = []
+    for _ in range(repeat):
+        start = time.time()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=CODE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.splitlines()[-1]) - start)
+    return samples
+
+
+def bench_import(min_time, repeat):
+    # Benchmark importing the game and engine in a new interpreter, which must not import pygame.
+
+    samples = []
+    for _ in range(repeat):
+        start = time.time()
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=CODE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.splitlines()[-1]) - start)
+    return samples
+
+
+def bench_game(spec):
+    # Create a benchmark of whole simulated 2 player games between two bots.
+    # spec - str; the bot policy of both players
+    # returns - function; the benchmark
+
+    def benchmark(min_time, repeat):
+        seed = [0]
+
+        def play_game():
+            seed[0] += 1
+            state = GameState(2, seed=seed[0])
+            bot = create_bot(spec, seed[0])
+            while not state.is_over:
+                state.play(bot.choose(state))
+        return time_calls(play_game, min_time, repeat)
+    return benchmark
+
+
+def bench_moves_engine(num_players):
+    # Create a benchmark of the time per move of stepping separate GameStates with random bots.
+    # num_players - int; the number of players
+    # returns - function; the benchmark
+
+    def benchmark(min_time, repeat):
+        samples = []
+        seed = 0
+        for _ in range(repeat):
+            num_moves = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < min_time:
+                seed += 1
+                state = GameState(num_players, seed=seed)
+                bot = create_bot('random', seed)
+                while not state.is_over:
+                    state.play(bot.choose(state))
+                    num_moves += 1
+            samples.append((time.perf_counter() - start) / num_moves)
+        return samples
+    return benchmark
+
+
+def bench_moves_batch(min_time, repeat):
+    # Benchmark the time per move of random games played in lockstep by a BatchState.
+    # Skipped, by returning None, when NumPy is not installed.
+
+    try:
+        from sequence_batch import BatchState
+    except ImportError:
+        return None
+    samples = []
+    seed = 0
+    for _ in range(repeat):
+        num_moves = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_time:
+            seed += 1
+            num_moves += BatchState(BATCH_GAMES, 2, seed=seed, record=False).play_random()
+        samples.append((time.perf_counter() - start) / num_moves)
+    return samples
+
+
+def find_click(game):
+    # Return the centre of a Tile the current player of a Game can place a chip on.
+    # game - Game; the Game
+    # returns - tuple; the x and y coordinates of the Tile, or None if the player cannot place a chip
+
+    hand = game.get_current_player().get_hand()
+    has_jack = 'JC' in hand or 'JD' in hand
+    for row in game.board.tiles:
+        for tile in row:
+            card = tile.get_card()
+            if tile.color is None and card != 'W' and (has_jack or card in hand):
+                return tile.view.rects[tile.index].center
+    return None
+
+
+def bench_table_turn(num_players):
+    # Create a benchmark of the time per turn of the game window with a number of players.
+    # A turn is the two clicks of a player: one to show the hand and one to place a chip,
+    # each followed by a full draw. A new Game, with its card images loaded, is started
+    # outside the timing whenever a game ends or the current player can only remove chips.
+    # num_players - int; the number of players
+    # returns - function; the benchmark
+
+    def benchmark(min_time, repeat):
+        game = create_game(num_players)
+        samples = []
+        # Each finished game prints its result.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                num_turns = 0
+                elapsed = 0.0
+                while elapsed < min_time:
+                    position = find_click(game)
+                    if not game.continue_game or position is None:
+                        game = sequence_main.Game(game.surface, num_players=num_players)
+                        game.images_dict.load_all()
+                        continue
+                    event = pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=position)
+                    start = time.perf_counter()
+                    game.handle_mouse_up(event)
+                    game.handle_mouse_up(event)
+                    elapsed += time.perf_counter() - start
+                    num_turns += 1
+                samples.append(elapsed / num_turns)
+        return samples
+    return benchmark
+
+
+# The directory of the program, where the layouts and card images are found.
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Run in a new interpreter; prints the wall clock time when the first frame has been drawn.
+STARTUP_SCRIPT = (
+    "import pygame, sequence_main, time\n"
+    "pygame.init()\n"
+    "sequence_main.Game(pygame.display.set_mode((1920, 1020)))\n"
+    "print(time.time())\n"
+)
+# Run in a new interpreter; prints the wall clock time when the modules have been imported.
+IMPORT_SCRIPT = (
+    "import sequence_main, sequence_engine, sys, time\n"
+    "assert 'pygame' not in sys.modules\n"
+    "print(time.time())\n"
+)
+# The number of games played at once by the batch benchmark.
+BATCH_GAMES = 4096
+# The benchmarks by name, in the order they are run.
+BENCHMARKS = [
+    ('check_sequences_empty', bench_check_sequences(0.0)),
+    ('check_sequences_mid', bench_check_sequences(0.4)),
+    ('check_sequences_full', bench_check_sequences(0.9)),
+    ('legal_moves', bench_legal_moves),
+    ('board_select', bench_select),
+    ('game_draw', bench_draw),
+    ('startup_import', bench_import),
+    ('startup_first_frame', bench_startup),
+    ('game_random', bench_game('random')),
+    ('game_greedy', bench_game('greedy')),
+    ('moves_engine', bench_moves_engine(2)),
+    ('moves_batch', bench_moves_batch)
+]
+# The per-turn cost of the game window and the engine for every supported number of players.
+BENCHMARKS += [('table_turn_{}'.format(num), bench_table_turn(num)) for num in sorted(NUM_CARDS)]
+BENCHMARKS += [('table_engine_{}'.format(num), bench_moves_engine(num)) for num in sorted(NUM_CARDS)]
+
+
+if __name__ == '__main__':
+    main()
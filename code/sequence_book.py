@@ -0,0 +1,270 @@
+# This module builds and reads position books: the outcomes of self-play games by position.
+# The builder replays game records and counts, for every position in the first moves of
+# each game, how often each team went on to win. Positions are keyed by a 64-bit Zobrist
+# hash made canonical over the symmetries of the layout, and the book is saved as a
+# header followed by fixed-size records sorted by key. Bots open a book with mmap and
+# binary-search it, so opening costs nothing up front and every process reading the same
+# book shares one copy in the page cache.
+# Example: python sequence_book.py records.jsonl book.bin --players 2 --moves 20
+
+import argparse
+import json
+import mmap
+import random
+import struct
+from sequence_engine import get_num_teams, is_one_eyed, replay
+from sequence_layout import load_layout
+
+
+# User-defined functions
+
+def main():
+    # Build a book from the game records named on the command line.
+
+    parser = argparse.ArgumentParser(description="Build a Sequence position book from game records.")
+    parser.add_argument('files', nargs='+', help="JSON lines files of game records")
+    parser.add_argument('output', help="book file to write")
+    parser.add_argument('--players', type=int, default=2, help="only use games with this many players")
+    parser.add_argument('--layout', default='board1', help="only use games on this layout")
+    parser.add_argument('--moves', type=int, default=20, help="number of opening moves of each game to count")
+    parser.add_argument('--min-games', type=int, default=2, help="leave out positions seen in fewer games")
+    args = parser.parse_args()
+    stats = build_stats(args.files, args.players, args.layout, args.moves)
+    num_records = save_book(args.output, stats, args.players, args.layout, args.min_games)
+    print("{} positions, {} saved to {}".format(len(stats), num_records, args.output))
+
+
+def get_symmetries(layout):
+    # Return the cell permutations among the rotations and reflections of the board that
+    # leave every card in place.
+    # layout - Layout; the compiled layout
+    # returns - list; the tuple permutation of each symmetry, starting with the identity
+
+    size = layout.size
+    last = size - 1
+    transforms = [
+        lambda row, col: (row, col),
+        lambda row, col: (col, last - row),
+        lambda row, col: (last - row, last - col),
+        lambda row, col: (last - col, row),
+        lambda row, col: (row, last - col),
+        lambda row, col: (last - row, col),
+        lambda row, col: (col, row),
+        lambda row, col: (last - col, last - row)
+    ]
+    symmetries = []
+    for transform in transforms:
+        permutation = []
+        for cell in range(size * size):
+            row_ind, col_ind = transform(cell // size, cell % size)
+            permutation.append(row_ind * size + col_ind)
+        if all(layout.cards[permutation[cell]] == layout.cards[cell] for cell in range(size * size)):
+            symmetries.append(tuple(permutation))
+    return symmetries
+
+
+def get_zobrist_keys(num_cells):
+    # Return the random 64-bit keys of each team's chip on each cell and of each team to move.
+    # The keys come from a fixed seed, so every process and every build agree on them.
+    # num_cells - int; the number of cells
+    # returns - tuple; the list of 3 keys for each cell and the list of keys for each team to move
+
+    rng = random.Random(ZOBRIST_SEED)
+    cell_keys = [[rng.getrandbits(64) for _ in range(MAX_TEAMS)] for _ in range(num_cells)]
+    turn_keys = [rng.getrandbits(64) for _ in range(MAX_TEAMS)]
+    return cell_keys, turn_keys
+
+
+def get_layout_symmetries(layout):
+    # Return the symmetries of a layout, computing them and its Zobrist keys on first use.
+    # layout - Layout; the compiled layout
+    # returns - list; the tuple permutation of each symmetry
+
+    symmetries = layout_symmetries.get(layout)
+    if symmetries is None:
+        symmetries = get_symmetries(layout)
+        layout_symmetries[layout] = symmetries
+        zobrist_keys[layout] = get_zobrist_keys(len(layout.cards))
+    return symmetries
+
+
+def build_stats(paths, num_players, layout, num_moves):
+    # Count the outcomes of the games reaching each position in the opening moves.
+    # paths - list; the str paths of JSON lines files of game records
+    # num_players - int; the number of players of the games to use
+    # layout - str; the name or path of the layout of the games to use
+    # num_moves - int; the number of opening moves of each game to count
+    # returns - dict; the [games, wins of team 0, 1 and 2] of each canonical hash
+
+    layout = load_layout(layout)
+    num_teams = get_num_teams(num_players)
+    symmetries = get_layout_symmetries(layout)
+    cell_keys, turn_keys = zobrist_keys[layout]
+    stats = {}
+    for path in paths:
+        with open(path, 'r') as in_file:
+            for line in in_file:
+                if line.strip() == '':
+                    continue
+                record = json.loads(line)
+                if record['num_players'] != num_players or load_layout(record['layout']) is not layout:
+                    continue
+                # The hash under each symmetry is updated as chips are placed and removed.
+                hashes = [0] * len(symmetries)
+                chips = [None] * len(layout.cards)
+                for turn_num, move, _ in replay(record):
+                    if turn_num >= num_moves:
+                        break
+                    card, cell = move[0], move[1]
+                    team = turn_num % num_teams
+                    if is_one_eyed(card):
+                        team = chips[cell]
+                        chips[cell] = None
+                    else:
+                        chips[cell] = team
+                    for ind, permutation in enumerate(symmetries):
+                        hashes[ind] ^= cell_keys[permutation[cell]][team]
+                    next_team = (turn_num + 1) % num_teams
+                    key = min(value ^ turn_keys[next_team] for value in hashes)
+                    counts = stats.get(key)
+                    if counts is None:
+                        counts = [0] * (1 + MAX_TEAMS)
+                        stats[key] = counts
+                    counts[0] += 1
+                    if record['winner'] is not None:
+                        counts[1 + record['winner']] += 1
+    return stats
+
+
+def save_book(path, stats, num_players, layout, min_games):
+    # Save the positions seen in enough games as a book file, sorted by key.
+    # path - str; the path of the book file
+    # stats - dict; the counts of each canonical hash from build_stats
+    # num_players - int; the number of players of the games
+    # layout - str; the name or path of the layout
+    # min_games - int; the fewest games a position must have been seen in
+    # returns - int; the number of records saved
+
+    keys = sorted(key for key, counts in stats.items() if counts[0] >= min_games)
+    name = load_layout(layout).ref.encode('utf-8')
+    if len(name) > LAYOUT_REF_SIZE:
+        raise ValueError("Layout path too long for a book header: {}".format(layout))
+    with open(path, 'wb') as out_file:
+        out_file.write(struct.pack(HEADER_FORMAT, BOOK_MAGIC, BOOK_VERSION, num_players, len(keys), name))
+        for key in keys:
+            out_file.write(struct.pack(RECORD_FORMAT, key, *stats[key]))
+    return len(keys)
+
+
+def open_book(path):
+    # Return the PositionBook of a file, opening it once per process.
+    # path - str; the path of the book file
+    # returns - PositionBook; the book
+
+    book = books.get(path)
+    if book is None:
+        book = PositionBook(path)
+        books[path] = book
+    return book
+
+
+# User-defined classes
+
+class PositionBook:
+    # This class represents a book file mapped into memory.
+    # Nothing is read until a lookup touches a page, and the pages are shared by every
+    # process that maps the same file.
+
+    def __init__(self, path):
+        # Map a book file and read its header.
+        # self - PositionBook; the PositionBook to initialize
+        # path - str; the path of the book file
+
+        with open(path, 'rb') as in_file:
+            self.data = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_players, self.num_records, name = struct.unpack_from(HEADER_FORMAT, self.data)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError("Not a position book: {}".format(path))
+        self.layout = load_layout(name.rstrip(b'\0').decode('utf-8'))
+        self.num_teams = get_num_teams(self.num_players)
+        self.symmetries = get_layout_symmetries(self.layout)
+        self.cell_keys, self.turn_keys = zobrist_keys[self.layout]
+
+    def lookup(self, key):
+        # Binary-search the book for a key.
+        # self - PositionBook; the PositionBook object
+        # key - int; the canonical hash of a position
+        # returns - tuple; the games and the wins of each team, or None if the position is not in the book
+
+        data = self.data
+        low = 0
+        high = self.num_records
+        while low < high:
+            mid = (low + high) // 2
+            offset = HEADER_SIZE + mid * RECORD_SIZE
+            mid_key = KEY_STRUCT.unpack_from(data, offset)[0]
+            if mid_key < key:
+                low = mid + 1
+            elif mid_key > key:
+                high = mid
+            else:
+                return COUNTS_STRUCT.unpack_from(data, offset + KEY_STRUCT.size)
+        return None
+
+    def get_hashes(self, state):
+        # Return the hash of a GameState's chips under each symmetry, without the team to move.
+        # self - PositionBook; the PositionBook object
+        # state - GameState; the state of the game
+        # returns - list; the int hash under each symmetry
+
+        cell_keys = self.cell_keys
+        hashes = []
+        for permutation in self.symmetries:
+            value = 0
+            for cell, chip in enumerate(state.chips):
+                if chip is not None:
+                    value ^= cell_keys[permutation[cell]][chip]
+            hashes.append(value)
+        return hashes
+
+    def get_move_stats(self, state, hashes, move):
+        # Return the book entry of the position a move leads to.
+        # self - PositionBook; the PositionBook object
+        # state - GameState; the state before the move
+        # hashes - list; the hashes of the state from get_hashes
+        # move - tuple; the str card ID and int cell index of the move
+        # returns - tuple; the games and the wins of each team, or None if the position is not in the book
+
+        card, cell = move
+        team = state.get_current_team()
+        if is_one_eyed(card):
+            team = state.chips[cell]
+        turn_key = self.turn_keys[(state.turn_num + 1) % self.num_teams]
+        key = min(value ^ self.cell_keys[permutation[cell]][team] ^ turn_key
+                  for value, permutation in zip(hashes, self.symmetries))
+        return self.lookup(key)
+
+
+# The identifier and version at the start of a book file.
+BOOK_MAGIC = b'SEQBOOK\0'
+BOOK_VERSION = 2
+# The header: magic, version, number of players, number of records and layout ref,
+# the name of a shipped layout or the path of any other.
+LAYOUT_REF_SIZE = 256
+HEADER_FORMAT = '<8sIII{}s'.format(LAYOUT_REF_SIZE)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# A record: the canonical hash, the number of games and the wins of each of up to 3 teams.
+RECORD_FORMAT = '<QIIII'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+KEY_STRUCT = struct.Struct('<Q')
+COUNTS_STRUCT = struct.Struct('<IIII')
+MAX_TEAMS = 3
+ZOBRIST_SEED = 20201
+# Symmetries and Zobrist keys by compiled Layout, and open books by path.
+layout_symmetries = {}
+zobrist_keys = {}
+books = {}
+
+
+if __name__ == '__main__':
+    main()
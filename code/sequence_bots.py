@@ -0,0 +1,247 @@
+# This module contains the bot policies that play Sequence on a GameState.
+# A policy is named by a spec string: 'random', 'greedy', 'mcts:<playouts>' or 'book:<path>'.
+
+import math
+import random
+from sequence_engine import is_one_eyed
+from sequence_book import open_book
+
+
+# User-defined functions
+
+def create_bot(spec, seed=None):
+    # Create a bot from its spec string.
+    # spec - str; 'random', 'greedy', 'mcts', 'mcts:<playouts>' or 'book:<path>'
+    # seed - int; the seed of the bot's random number generator, or None
+    # returns - RandomBot, GreedyBot, MCTSBot or BookBot; the bot
+
+    name, _, budget = spec.partition(':')
+    rng = random.Random(seed)
+    if name == 'random':
+        return RandomBot(rng)
+    elif name == 'greedy':
+        return GreedyBot(rng)
+    elif name == 'mcts':
+        if budget == '':
+            budget = MCTS_BUDGET
+        return MCTSBot(rng, int(budget))
+    elif name == 'book':
+        return BookBot(rng, open_book(budget))
+    raise ValueError("Unknown bot policy: {}".format(spec))
+
+
+def score_move(state, move):
+    # Score a move by the threats it builds and blocks along the windows of 5 through its cell.
+    # An open window scores more the more chips it already holds, so extending a long
+    # line or filling a window an opponent needs scores highest.
+    # state - GameState; the state before the move
+    # move - tuple; the str card ID and int cell index of the move
+    # returns - int; the score of the move
+
+    card, cell = move
+    layout = state.layout
+    chips = state.chips
+    wild = layout.wild
+    team = state.get_current_team()
+    if is_one_eyed(card):
+        # A removal is scored by the windows of the removed chip's team that it breaks.
+        team = chips[cell]
+    score = 0
+    for window_ind in layout.cell_windows[cell]:
+        own = 0
+        other = 0
+        for window_cell in layout.get_window(window_ind):
+            chip = chips[window_cell]
+            if wild[window_cell] or chip == team:
+                own += 1
+            elif chip is not None:
+                other += 1
+        if other == 0:
+            score += THREAT_SCORES[own]
+        elif own == 0 and not is_one_eyed(card):
+            score += THREAT_SCORES[other] // 2
+    return score
+
+
+# User-defined classes
+
+class RandomBot:
+    # This class represents a bot that plays a random legal move.
+
+    def __init__(self, rng):
+        # Initialize a RandomBot.
+        # self - RandomBot; the bot to initialize
+        # rng - random.Random; the random number generator of the bot
+
+        self.rng = rng
+
+    def choose(self, state):
+        # Choose a move for the current player.
+        # self - RandomBot; the bot choosing
+        # state - GameState; the state of the game
+        # returns - tuple; the move to play
+
+        return self.rng.choice(state.get_legal_moves())
+
+
+class GreedyBot:
+    # This class represents a bot that plays the move scoring the most threat, breaking ties randomly.
+
+    def __init__(self, rng):
+        # Initialize a GreedyBot.
+        # self - GreedyBot; the bot to initialize
+        # rng - random.Random; the random number generator of the bot
+
+        self.rng = rng
+
+    def choose(self, state):
+        # Choose a move for the current player.
+        # self - GreedyBot; the bot choosing
+        # state - GameState; the state of the game
+        # returns - tuple; the move to play
+
+        best_moves = []
+        best_score = -1
+        for move in state.get_legal_moves():
+            score = score_move(state, move)
+            if score > best_score:
+                best_moves = [move]
+                best_score = score
+            elif score == best_score:
+                best_moves.append(move)
+        return self.rng.choice(best_moves)
+
+
+class MCTSBot:
+    # This class represents a bot that picks moves by Monte Carlo tree search at the root.
+    # Hidden cards are re-dealt at random before each playout, and each root move is
+    # chosen by UCB1 and scored by a random playout to the end of the game. The root moves
+    # are first tried in random order, so a budget smaller than the number of moves
+    # samples them at random, and the most visited move is played, the best scoring first.
+
+    def __init__(self, rng, budget):
+        # Initialize an MCTSBot.
+        # self - MCTSBot; the bot to initialize
+        # rng - random.Random; the random number generator of the bot
+        # budget - int; the number of playouts per move
+
+        self.rng = rng
+        self.budget = budget
+
+    def choose(self, state):
+        # Choose a move for the current player.
+        # self - MCTSBot; the bot choosing
+        # state - GameState; the state of the game
+        # returns - tuple; the move to play
+
+        moves = state.get_legal_moves()
+        if len(moves) == 1:
+            return moves[0]
+        team = state.get_current_team()
+        visits = [0] * len(moves)
+        wins = [0.0] * len(moves)
+        order = list(range(len(moves)))
+        self.rng.shuffle(order)
+        for playout in range(self.budget):
+            if playout < len(moves):
+                move_ind = order[playout]
+            else:
+                log_total = math.log(playout)
+                move_ind = 0
+                best_value = -1
+                for ind in range(len(moves)):
+                    value = wins[ind] / visits[ind] + UCB_CONSTANT * math.sqrt(log_total / visits[ind])
+                    if value > best_value:
+                        move_ind = ind
+                        best_value = value
+            visits[move_ind] += 1
+            wins[move_ind] += self.playout(state, moves[move_ind], team)
+        # Ties in visits go to the best mean result, and remaining ties to the earliest in the random order.
+        best_ind = max(order, key=lambda ind: (visits[ind], wins[ind] / max(visits[ind], 1)))
+        return moves[best_ind]
+
+    def playout(self, state, move, team):
+        # Play a move and then random moves to the end of a game with the hidden cards re-dealt.
+        # self - MCTSBot; the bot searching
+        # state - GameState; the state of the game
+        # move - tuple; the first move to play
+        # team - int; the team index of the searching player
+        # returns - float; 1 for a win, 0.5 for a tie and 0 for a loss
+
+        state = self.determinize(state)
+        state.play(move)
+        while not state.is_over:
+            state.play(self.rng.choice(state.get_legal_moves()))
+        if state.winner is None:
+            return 0.5
+        return float(state.winner == team)
+
+    def determinize(self, state):
+        # Return a copy of the state with the other players' hands and the deck shuffled together and re-dealt.
+        # self - MCTSBot; the bot searching
+        # state - GameState; the state of the game
+        # returns - GameState; the copy
+
+        state = state.copy()
+        seat = state.get_current_seat()
+        unseen = list(state.deck)
+        for other_seat, hand in enumerate(state.hands):
+            if other_seat != seat:
+                unseen.extend(hand)
+        self.rng.shuffle(unseen)
+        for other_seat, hand in enumerate(state.hands):
+            if other_seat != seat:
+                for ind in range(len(hand)):
+                    hand[ind] = unseen.pop()
+        state.deck = unseen
+        return state
+
+
+class BookBot:
+    # This class represents a bot that plays the move whose resulting position won most
+    # often in a position book, and plays like a GreedyBot once the game leaves the book.
+
+    def __init__(self, rng, book):
+        # Initialize a BookBot.
+        # self - BookBot; the bot to initialize
+        # rng - random.Random; the random number generator of the bot
+        # book - PositionBook; the book, shared by every bot in the process
+
+        self.rng = rng
+        self.book = book
+        self.fallback = GreedyBot(rng)
+
+    def choose(self, state):
+        # Choose a move for the current player.
+        # self - BookBot; the bot choosing
+        # state - GameState; the state of the game
+        # returns - tuple; the move to play
+
+        book = self.book
+        if book.num_players != state.num_players or book.layout is not state.layout:
+            return self.fallback.choose(state)
+        team = state.get_current_team()
+        hashes = book.get_hashes(state)
+        best_move = None
+        best_rate = -1.0
+        for move in state.get_legal_moves():
+            stats = book.get_move_stats(state, hashes, move)
+            if stats is not None and stats[0] >= BOOK_MIN_GAMES:
+                # The win rate is smoothed towards 1/2 so rarely seen positions do not dominate.
+                rate = (stats[1 + team] + 1) / (stats[0] + 2)
+                if rate > best_rate:
+                    best_move = move
+                    best_rate = rate
+        if best_move is None:
+            return self.fallback.choose(state)
+        return best_move
+
+
+# The score of an open window by the number of chips it holds, from 0 to 5.
+THREAT_SCORES = [1, 4, 16, 64, 256, 1024]
+# The default number of playouts per move of an MCTSBot.
+MCTS_BUDGET = 100
+# The exploration constant of UCB1.
+UCB_CONSTANT = 1.4
+# The fewest games a book position must have been seen in for a BookBot to use it.
+BOOK_MIN_GAMES = 4
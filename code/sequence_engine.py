@@ -0,0 +1,299 @@
+# This module implements the rules of Sequence without any graphics.
+# A GameState holds the deck, the hands and the chips on the board, and plays
+# moves for bots and simulators the same way the Game plays clicked Tiles.
+# The module does not use pygame.
+
+import random
+from sequence_layout import load_layout, count_sequences_at, get_card_ids
+
+
+# User-defined functions
+
+def get_num_teams(num_players):
+    # Determine the number of teams given the number of players.
+    # num_players - int; the number of players
+    # returns - int; the number of teams, or None if the players cannot be split evenly
+
+    if num_players % 3 == 0:
+        return 3
+    elif num_players % 2 == 0:
+        return 2
+    return None
+
+
+def get_num_cards(num_players):
+    # Return the number of cards dealt to each player given the number of players.
+    # num_players - int; the number of players
+    # returns - int; the number of cards for each player, or None if not supported
+
+    return NUM_CARDS.get(num_players)
+
+
+def get_max_sequences(num_teams):
+    # Determine the number of sequences required to win.
+    # num_teams - int; the number of teams
+    # returns - int; the number of sequences required
+
+    if num_teams == 2:
+        return 3
+    return 2
+
+
+def setup_deck(copies=2, rng=random):
+    # Setup and return a shuffled deck.
+    # copies - int; the number of standard decks shuffled together
+    # rng - random.Random; the random number generator used to shuffle
+    # returns - list; the cards in the deck
+
+    deck = get_card_ids() * copies
+    rng.shuffle(deck)
+    return deck
+
+
+def is_two_eyed(card):
+    # Return True if the card is a two-eyed jack, which places a chip on any open Tile.
+    # card - str; the card ID
+
+    return card == 'JC' or card == 'JD'
+
+
+def is_one_eyed(card):
+    # Return True if the card is a one-eyed jack, which removes an opponent's chip.
+    # card - str; the card ID
+
+    return card == 'JS' or card == 'JH'
+
+
+# User-defined classes
+
+class GameState:
+    # This class represents the state of a game of Sequence without graphics.
+    # Chips are stored as the int index of the team that placed them, or None.
+    # A move is a tuple of the str card ID played and the int cell index played on.
+
+    def __init__(self, num_players=2, layout='board1', seed=None):
+        # Initialize a GameState and deal the cards.
+        # self - GameState; the GameState to initialize
+        # num_players - int; the number of players, a key of NUM_CARDS
+        # layout - str; the name or path of the board layout
+        # seed - int; the seed used to shuffle the deck, or None
+
+        if get_num_cards(num_players) is None:
+            raise ValueError("Unsupported number of players: {}".format(num_players))
+        self.layout = load_layout(layout)
+        self.num_players = num_players
+        self.num_teams = get_num_teams(num_players)
+        self.num_cards = get_num_cards(num_players)
+        self.max_sequences = get_max_sequences(self.num_teams)
+        self.seed = seed
+        self.deck = setup_deck(self.layout.copies, random.Random(seed))
+        self.hands = self.setup_hands()
+        self.chips = [None] * len(self.layout.cards)
+        self.num_sequences = [0] * self.num_teams
+        self.turn_num = 0
+        # The seat and team to move are advanced with each move rather than derived from turn_num.
+        self.seat = 0
+        self.team = 0
+        self.winner = None
+        self.is_over = False
+        self.history = []
+
+    def setup_hands(self):
+        # Deal the hands of cards for each player from the end of the deck.
+        # self - GameState; the GameState object
+        # returns - list; a 2D list of str of the card IDs for each player
+
+        hands = [[] for _ in range(self.num_players)]
+        for _ in range(self.num_cards):
+            for hand in hands:
+                hand.append(self.deck.pop())
+        return hands
+
+    def copy(self):
+        # Return an independent copy of the GameState, sharing the compiled layout.
+        # self - GameState; the GameState to copy
+        # returns - GameState; the copy
+
+        state = GameState.__new__(GameState)
+        state.__dict__.update(self.__dict__)
+        state.deck = list(self.deck)
+        state.hands = [list(hand) for hand in self.hands]
+        state.chips = list(self.chips)
+        state.num_sequences = list(self.num_sequences)
+        state.history = list(self.history)
+        return state
+
+    def get_current_seat(self):
+        # Return the seat index of the player whose turn it is.
+        # self - GameState; the GameState object
+
+        return self.seat
+
+    def get_current_team(self):
+        # Return the team index of the player whose turn it is.
+        # self - GameState; the GameState object
+
+        return self.team
+
+    def get_legal_moves(self):
+        # Return the moves available to the current player.
+        # self - GameState; the GameState object
+        # returns - list; the (card, cell) tuples that can be played
+
+        team = self.get_current_team()
+        chips = self.chips
+        wild = self.layout.wild
+        moves = []
+        # Each card is tried once, in hand order, so the moves come in the same order in every
+        # interpreter and a seeded bot replays the same game.
+        for card in dict.fromkeys(self.hands[self.get_current_seat()]):
+            if is_two_eyed(card):
+                for cell in range(len(chips)):
+                    if chips[cell] is None and not wild[cell]:
+                        moves.append((card, cell))
+            elif is_one_eyed(card):
+                for cell in range(len(chips)):
+                    if chips[cell] is not None and chips[cell] != team and self.can_remove(cell):
+                        moves.append((card, cell))
+            else:
+                for cell in self.layout.get_cells(card):
+                    if chips[cell] is None:
+                        moves.append((card, cell))
+        return moves
+
+    def has_legal_move(self):
+        # Return True if the current player has a move, stopping at the first one found.
+        # self - GameState; the GameState object
+
+        team = self.get_current_team()
+        chips = self.chips
+        wild = self.layout.wild
+        for card in self.hands[self.get_current_seat()]:
+            if is_two_eyed(card):
+                for cell in range(len(chips)):
+                    if chips[cell] is None and not wild[cell]:
+                        return True
+            elif is_one_eyed(card):
+                for cell in range(len(chips)):
+                    if chips[cell] is not None and chips[cell] != team and self.can_remove(cell):
+                        return True
+            else:
+                for cell in self.layout.get_cells(card):
+                    if chips[cell] is None:
+                        return True
+        return False
+
+    def can_remove(self, cell):
+        # Return True if removing the chip on a cell does not break one of its team's sequences.
+        # self - GameState; the GameState object
+        # cell - int; the cell index of the chip
+
+        team = self.chips[cell]
+        if self.num_sequences[team] == 0:
+            return True
+        before = count_sequences_at(self.layout, self.chips, team, cell)
+        self.chips[cell] = None
+        after = count_sequences_at(self.layout, self.chips, team, cell)
+        self.chips[cell] = team
+        return after >= before
+
+    def count_dead_cards(self, seat):
+        # Count the cards in a hand that can no longer be played because both Tiles are taken.
+        # self - GameState; the GameState object
+        # seat - int; the seat index of the player
+        # returns - int; the number of dead cards
+
+        dead = 0
+        for card in self.hands[seat]:
+            if card[0] != 'J':
+                is_dead = True
+                for cell in self.layout.get_cells(card):
+                    if self.chips[cell] is None:
+                        is_dead = False
+                if is_dead:
+                    dead += 1
+        return dead
+
+    def play(self, move):
+        # Play a move for the current player, draw a new card and check whether the game is over.
+        # self - GameState; the GameState object
+        # move - tuple; the str card ID and int cell index of a legal move
+
+        card, cell = move
+        seat = self.get_current_seat()
+        team = self.get_current_team()
+        self.history.append([card, cell, self.count_dead_cards(seat)])
+        if is_one_eyed(card):
+            self.chips[cell] = None
+        else:
+            before = count_sequences_at(self.layout, self.chips, team, cell)
+            self.chips[cell] = team
+            self.num_sequences[team] += count_sequences_at(self.layout, self.chips, team, cell) - before
+        hand = self.hands[seat]
+        hand.remove(card)
+        if len(self.deck) > 0:
+            hand.append(self.deck.pop())
+        self.turn_num += 1
+        self.seat += 1
+        if self.seat == self.num_players:
+            self.seat = 0
+        self.team += 1
+        if self.team == self.num_teams:
+            self.team = 0
+        self.decide_continue()
+
+    def decide_continue(self):
+        # Check and remember whether the game is over.
+        # A team wins when it reaches the required sequences; it is a tie when the next player cannot move.
+        # self - GameState; the GameState to check
+
+        for team, num in enumerate(self.num_sequences):
+            if num >= self.max_sequences:
+                self.winner = team
+                self.is_over = True
+                return
+        if not self.has_legal_move():
+            self.is_over = True
+
+    def get_record(self):
+        # Return a record of the game that can be saved as JSON and replayed.
+        # self - GameState; the GameState object
+        # returns - dict; the layout, players, seed, moves played and winner
+
+        return {
+            'layout': self.layout.ref,
+            'num_players': self.num_players,
+            'seed': self.seed,
+            'moves': self.history,
+            'winner': self.winner
+        }
+
+
+def replay(record):
+    # Replay a game record, yielding the chips on the board after every move.
+    # The list yielded is updated in place, so copy it to keep a position.
+    # record - dict; a game record from GameState.get_record
+    # yields - tuple; the int turn number, the move list and the chips list
+
+    layout = load_layout(record['layout'])
+    num_teams = get_num_teams(record['num_players'])
+    chips = [None] * len(layout.cards)
+    for turn_num, move in enumerate(record['moves']):
+        if is_one_eyed(move[0]):
+            chips[move[1]] = None
+        else:
+            chips[move[1]] = turn_num % num_teams
+        yield turn_num, move, chips
+
+
+# The number of cards dealt to each player, by the supported numbers of players.
+NUM_CARDS = {
+    2: 7,
+    3: 6,
+    4: 6,
+    6: 5,
+    8: 4,
+    9: 4,
+    10: 3,
+    12: 3
+}
@@ -0,0 +1,390 @@
+# This program checks the fast sequence counters against the original recursive one.
+# Random and adversarial boards (long runs, crossing diagonals, runs through the wild
+# corners) are generated in batches over a process pool. Each board is counted by
+# count_sequences, by the incremental count_sequences_at used by the engine, and by
+# the recursive reference from the first version of Board.check_sequences and
+# sequence_test2.py. When NumPy is installed, the batched placement and removal
+# counters of sequence_batch are checked against them too. Any mismatch is shrunk to
+# a board with as few chips as possible and saved as a JSON fixture, and saved
+# fixtures are re-checked on every run.
+# Example: python sequence_fuzz.py --seconds 60
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sequence_layout import Layout, load_layout, count_sequences, count_sequences_at, get_card_ids
+try:
+    import numpy as np
+    from sequence_batch import get_tables, get_placement_changes, get_removal_changes
+except ImportError:
+    np = None
+
+
+# User-defined functions
+
+def main():
+    # Check saved fixtures, then fuzz for the time given on the command line.
+
+    args = parse_args()
+    failures = check_fixtures(args.fixtures)
+    start = time.perf_counter()
+    cases = 0
+    seed = args.seed
+    with ProcessPoolExecutor(args.workers) as executor:
+        while time.perf_counter() - start < args.seconds:
+            seeds = range(seed, seed + BATCHES_IN_FLIGHT * (args.workers or os.cpu_count()))
+            for num_checked, mismatches in executor.map(check_batch, seeds, [args.batch] * len(seeds)):
+                cases += num_checked
+                for mismatch in mismatches:
+                    path = save_fixture(args.fixtures, shrink(mismatch))
+                    print("Mismatch saved to {}".format(path))
+                    failures += 1
+            seed += len(seeds)
+    elapsed = time.perf_counter() - start
+    print("{} boards in {:.1f} s ({:.0f} per minute), {} failures".format(
+        cases, elapsed, cases * 60 / elapsed, failures))
+    if failures > 0:
+        sys.exit(1)
+
+
+def parse_args():
+    # Parse the command line arguments.
+    # returns - argparse.Namespace; the arguments
+
+    parser = argparse.ArgumentParser(description="Fuzz the fast sequence counters against the reference.")
+    parser.add_argument('--seconds', type=float, default=60, help="how long to fuzz for")
+    parser.add_argument('--batch', type=int, default=500, help="boards generated per batch")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first batch")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="directory of the regression fixtures")
+    return parser.parse_args()
+
+
+def reference_check_sequences(grid, color):
+    # Count the sequences for a color with the original recursive algorithm.
+    # grid - list; 2D list of the chip on each Tile, with 'W' on the wild Tiles
+    # color - str; the color of the team to check
+    # returns - int; number of valid sequences
+
+    sequences = 0
+    for row_ind in range(len(grid)):
+        for col_ind in range(len(grid)):
+            sequences += reference_check_sequence(grid, row_ind, col_ind, color)
+    return sequences
+
+
+def reference_check_sequence(grid, row_ind, col_ind, color):
+    # Count the sequences starting from the given Tile.
+
+    right = reference_check_right(grid, row_ind, col_ind, color)
+    down = reference_check_down(grid, row_ind, col_ind, color)
+    down_right = reference_check_down_right(grid, row_ind, col_ind, color)
+    down_left = reference_check_down_left(grid, row_ind, col_ind, color)
+    directions = [right, down, down_right, down_left]
+    count = 0
+    for direction in directions:
+        if direction == 5 or direction == 10:
+            count += 1
+    return count
+
+
+def reference_check_right(grid, row_ind, col_ind, color):
+    # Count the length of the series to the right of the Tile.
+
+    if 0 <= col_ind < len(grid):
+        if grid[row_ind][col_ind] == color or grid[row_ind][col_ind] == 'W':
+            return 1 + reference_check_right(grid, row_ind, col_ind + 1, color)
+    return 0
+
+
+def reference_check_down(grid, row_ind, col_ind, color):
+    # Count the length of the series downward from the Tile.
+
+    if 0 <= row_ind < len(grid):
+        if grid[row_ind][col_ind] == color or grid[row_ind][col_ind] == 'W':
+            return 1 + reference_check_down(grid, row_ind + 1, col_ind, color)
+    return 0
+
+
+def reference_check_down_right(grid, row_ind, col_ind, color):
+    # Count the length of the series downward and to the right of the Tile.
+
+    if 0 <= row_ind < len(grid) and 0 <= col_ind < len(grid):
+        if grid[row_ind][col_ind] == color or grid[row_ind][col_ind] == 'W':
+            return 1 + reference_check_down_right(grid, row_ind + 1, col_ind + 1, color)
+    return 0
+
+
+def reference_check_down_left(grid, row_ind, col_ind, color):
+    # Count the length of the series downward and to the left of the Tile.
+
+    if 0 <= row_ind < len(grid) and 0 <= col_ind < len(grid):
+        if grid[row_ind][col_ind] == color or grid[row_ind][col_ind] == 'W':
+            return 1 + reference_check_down_left(grid, row_ind + 1, col_ind - 1, color)
+    return 0
+
+
+def create_square_layout(size, seed):
+    # Create a valid layout of a given size with the cards in random order.
+    # size - int; the number of rows, such that every non-jack card fits equally often
+    # seed - int; the seed of the card order
+    # returns - Layout; the compiled layout
+
+    cards = [card for card in get_card_ids() if card[0] != 'J']
+    cards *= (size * size - 4) // len(cards)
+    random.Random(seed).shuffle(cards)
+    rows = []
+    for row_ind in range(size):
+        row = []
+        for col_ind in range(size):
+            if row_ind in (0, size - 1) and col_ind in (0, size - 1):
+                row.append('W')
+            else:
+                row.append(cards.pop())
+        rows.append(row)
+    return Layout('fuzz{}'.format(size), rows)
+
+
+def get_layouts():
+    # Return the layouts to fuzz: both shipped 10x10 layouts and larger generated ones.
+    # The shipped layouts are listed more than once so most boards are the size played.
+    # The layouts are created once per process, so the batched tables of each are built once.
+    # returns - list; the compiled layouts
+
+    global fuzz_layouts
+    if fuzz_layouts is None:
+        board1 = load_layout('board1')
+        board2 = load_layout('board2')
+        fuzz_layouts = [board1, board1, board1, board2, board2, board2,
+                        create_square_layout(14, 0), create_square_layout(22, 0)]
+    return fuzz_layouts
+
+
+def generate_board(layout, rng):
+    # Generate the chips of a random or adversarial board.
+    # layout - Layout; the layout of the board
+    # rng - random.Random; the random number generator
+    # returns - list; the chip color or None of each cell in row-major order
+
+    num_cells = len(layout.cards)
+    kind = rng.randrange(4)
+    density = rng.random()
+    chips = [None] * num_cells
+    for cell in range(num_cells):
+        if rng.random() < density:
+            chips[cell] = rng.choice(COLORS)
+    if kind >= 1:
+        # Lay long runs of one color along random lines, which may cross each other.
+        for _ in range(rng.randint(1, 4)):
+            lay_run(layout, chips, rng.choice(layout.lines), rng)
+    if kind >= 2:
+        # Lay runs along the diagonals through the same cell.
+        cell = rng.randrange(num_cells)
+        for line in layout.cell_lines[cell]:
+            if rng.random() < 0.7:
+                lay_run(layout, chips, line, rng)
+    if kind == 3:
+        # Lay runs along the lines through the wild corners.
+        corner = rng.choice([cell for cell in range(num_cells) if layout.wild[cell]])
+        for line in layout.cell_lines[corner]:
+            lay_run(layout, chips, line, rng)
+    return chips
+
+
+def lay_run(layout, chips, line, rng):
+    # Place a run of 4 to 11 chips of one color along part of a line.
+    # layout - Layout; the layout of the board
+    # chips - list; the chips of the board, updated in place
+    # line - tuple; the cell indices of the line
+    # rng - random.Random; the random number generator
+
+    length = min(len(line), rng.choice(RUN_LENGTHS))
+    start = rng.randint(0, len(line) - length)
+    color = rng.choice(COLORS)
+    for cell in line[start:start + length]:
+        chips[cell] = color
+
+
+def to_grid(layout, chips):
+    # Convert a board to the 2D grid used by the reference, with 'W' on the wild cells.
+    # layout - Layout; the layout of the board
+    # chips - list; the chip of each cell
+    # returns - list; 2D list of the chips
+
+    grid = []
+    for row_ind in range(layout.size):
+        row = []
+        for col_ind in range(layout.size):
+            cell = row_ind * layout.size + col_ind
+            if layout.wild[cell]:
+                row.append('W')
+            else:
+                row.append(chips[cell])
+        grid.append(row)
+    return grid
+
+
+def find_mismatch(layout, chips, cell):
+    # Compare the fast counters with the reference on a board.
+    # The incremental counter is checked by placing each color on the given cell.
+    # layout - Layout; the layout of the board
+    # chips - list; the chip of each cell
+    # cell - int; the cell used to check the incremental counter
+    # returns - str; a description of the first mismatch, or None
+
+    for color in COLORS:
+        expected = reference_check_sequences(to_grid(layout, chips), color)
+        actual = count_sequences(layout, chips, color)
+        if actual != expected:
+            return "count_sequences({}) = {}, expected {}".format(color, actual, expected)
+        # The board after the placement is an ordinary board, already covered by the
+        # comparison above, so the full fast count is used as the expected total.
+        previous = chips[cell]
+        before = count_sequences_at(layout, chips, color, cell)
+        chips[cell] = color
+        after = count_sequences_at(layout, chips, color, cell)
+        expected_after = count_sequences(layout, chips, color)
+        chips[cell] = previous
+        if expected + after - before != expected_after:
+            return "count_sequences_at({}, {}) changed by {}, expected {}".format(
+                color, cell, after - before, expected_after - expected)
+        if np is not None and not layout.wild[cell] and previous != color:
+            message = find_batch_mismatch(layout, chips, color, cell, expected_after - expected)
+            if message is not None:
+                return message
+    return None
+
+
+def find_batch_mismatch(layout, chips, color, cell, expected_change):
+    # Compare the batched counters with the change in the full count when a color is placed on a cell.
+    # Removing the chip again must undo the same change.
+    # layout - Layout; the layout of the board
+    # chips - list; the chip of each cell, without the color on the cell
+    # color - str; the color placed
+    # cell - int; the cell placed on, not a wild corner
+    # expected_change - int; the change in the color's sequences from placing the chip
+    # returns - str; a description of the mismatch, or None
+
+    tables = get_tables(layout)
+    owned = np.array([chip == color for chip in chips] + [False]) | tables['wild']
+    owned[cell] = False
+    rays = owned[tables['cell_rays'][cell]]
+    placed = int(get_placement_changes(rays[None], tables['sequences'])[0])
+    if placed != expected_change:
+        return "get_placement_changes({}, {}) = {}, expected {}".format(color, cell, placed, expected_change)
+    owned[cell] = True
+    removed = int(get_removal_changes(owned[None], tables['line_cells'], tables['cell_positions'])[0, cell])
+    if removed != -expected_change:
+        return "get_removal_changes({}, {}) = {}, expected {}".format(color, cell, removed, -expected_change)
+    return None
+
+
+def check_batch(seed, batch_size):
+    # Generate and check a batch of boards. Runs in a worker process.
+    # seed - int; the seed of the batch
+    # batch_size - int; the number of boards
+    # returns - tuple; the int number of boards checked and a list of mismatch dicts
+
+    rng = random.Random(seed)
+    layouts = get_layouts()
+    mismatches = []
+    for _ in range(batch_size):
+        layout = rng.choice(layouts)
+        chips = generate_board(layout, rng)
+        cell = rng.randrange(len(chips))
+        message = find_mismatch(layout, chips, cell)
+        if message is not None:
+            mismatches.append(create_fixture(layout, chips, cell, message))
+    return batch_size, mismatches
+
+
+def create_fixture(layout, chips, cell, message):
+    # Create the fixture describing a mismatching board.
+    # layout - Layout; the layout of the board
+    # chips - list; the chip of each cell
+    # cell - int; the cell used to check the incremental counter
+    # message - str; the description of the mismatch
+    # returns - dict; the fixture
+
+    rows = []
+    for row_ind in range(layout.size):
+        rows.append(list(layout.cards[row_ind * layout.size:(row_ind + 1) * layout.size]))
+    return {'rows': rows, 'chips': list(chips), 'cell': cell, 'message': message}
+
+
+def shrink(fixture):
+    # Shrink a mismatching board by removing chips while the mismatch remains.
+    # fixture - dict; the fixture of the mismatching board
+    # returns - dict; the fixture of the smallest mismatching board found
+
+    layout = Layout('fixture', fixture['rows'])
+    chips = list(fixture['chips'])
+    cell = fixture['cell']
+    message = fixture['message']
+    is_smaller = True
+    while is_smaller:
+        is_smaller = False
+        for ind in range(len(chips)):
+            if chips[ind] is not None:
+                previous = chips[ind]
+                chips[ind] = None
+                new_message = find_mismatch(layout, chips, cell)
+                if new_message is None:
+                    chips[ind] = previous
+                else:
+                    message = new_message
+                    is_smaller = True
+    return create_fixture(layout, chips, cell, message)
+
+
+def save_fixture(directory, fixture):
+    # Save a fixture to the fixture directory.
+    # directory - str; the directory of the fixtures
+    # fixture - dict; the fixture
+    # returns - str; the path of the saved fixture
+
+    os.makedirs(directory, exist_ok=True)
+    num_chips = len(fixture['chips']) - fixture['chips'].count(None)
+    path = os.path.join(directory, "mismatch_{}_{}.json".format(num_chips, int(time.time() * 1000)))
+    with open(path, 'w') as out_file:
+        json.dump(fixture, out_file)
+    return path
+
+
+def check_fixtures(directory):
+    # Re-check every saved fixture and report the ones that still mismatch.
+    # directory - str; the directory of the fixtures
+    # returns - int; the number of fixtures that still mismatch
+
+    failures = 0
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(directory, filename), 'r') as in_file:
+                    fixture = json.load(in_file)
+                layout = Layout('fixture', fixture['rows'])
+                message = find_mismatch(layout, list(fixture['chips']), fixture['cell'])
+                if message is not None:
+                    print("Fixture {} fails: {}".format(filename, message))
+                    failures += 1
+    return failures
+
+
+# The chip colors placed on fuzzed boards.
+COLORS = ['blue', 'green', 'red']
+# The lengths of the runs laid on adversarial boards.
+RUN_LENGTHS = [4, 5, 6, 9, 10, 11]
+# The number of batches submitted to the pool at a time for each worker.
+BATCHES_IN_FLIGHT = 4
+# The layouts fuzzed by this process, created by get_layouts.
+fuzz_layouts = None
+# The directory of the regression fixtures.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzz_fixtures')
+
+
+if __name__ == '__main__':
+    main()
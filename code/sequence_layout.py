@@ -0,0 +1,264 @@
+# This module loads the board layouts of Sequence.
+# A layout file lists the card ID of every Tile, one row per line, separated by spaces.
+# Each layout is validated once and compiled into compact lookup tables that are
+# cached for the rest of the process, so creating a Board never re-reads its file.
+# The module does not use pygame, so it can be shared by the game and the simulators.
+
+import os
+from array import array
+
+
+# User-defined functions
+
+def load_layout(name='board1'):
+    # Return the compiled Layout with the given name or path, compiling it on first use.
+    # name - str; a layout name such as 'board1', a file name, or a path to a layout file
+    # returns - Layout; the compiled layout
+
+    path = find_layout(name)
+    layout = layouts.get(path)
+    if layout is None:
+        with open(path, 'r') as in_file:
+            content = in_file.read()
+        rows = [line.split() for line in content.splitlines() if line.strip() != '']
+        name = os.path.splitext(os.path.basename(path))[0]
+        ref = name
+        if path != os.path.join(LAYOUT_DIR, name + '.txt'):
+            ref = path
+        layout = Layout(name, rows, ref)
+        layouts[path] = layout
+    return layout
+
+
+def find_layout(name):
+    # Return the absolute path of a layout file.
+    # Names without a directory are looked up next to this module.
+    # name - str; a layout name, file name or path
+    # returns - str; the path to the layout file
+
+    if os.path.isfile(name):
+        return os.path.abspath(name)
+    filename = name
+    if not filename.endswith('.txt'):
+        filename += '.txt'
+    path = os.path.join(LAYOUT_DIR, filename)
+    if not os.path.isfile(path):
+        raise ValueError("Unknown board layout: {}".format(name))
+    return path
+
+
+def count_sequences(layout, colors, color):
+    # Count the sequences for a given team, visiting each cell once per direction.
+    # A run of matching Tiles counts once when it reaches 5 and again when it reaches 10,
+    # the same as counting the runs of exactly 5 or 10 starting from every Tile.
+    # layout - Layout; the layout of the Board
+    # colors - list; the color of the chip on each cell in row-major order, or None
+    # color - str; the color of the team to check
+    # returns - int; number of valid sequences
+
+    wild = layout.wild
+    count = 0
+    for line in layout.lines:
+        run = 0
+        for cell in line:
+            if colors[cell] == color or wild[cell]:
+                run += 1
+            else:
+                if run >= SEQUENCE_LENGTH:
+                    count += 1 + (run >= 2 * SEQUENCE_LENGTH)
+                run = 0
+        if run >= SEQUENCE_LENGTH:
+            count += 1 + (run >= 2 * SEQUENCE_LENGTH)
+    return count
+
+
+def count_sequences_at(layout, colors, color, cell):
+    # Count the sequences for a given team along the lines through one cell.
+    # A move only changes the lines through its cell, so the change in this count
+    # is the change in the team's total.
+    # layout - Layout; the layout of the Board
+    # colors - list; the color of the chip on each cell in row-major order, or None
+    # color - str; the color of the team to check
+    # cell - int; the index of the cell
+    # returns - int; number of valid sequences through the cell's lines
+
+    wild = layout.wild
+    count = 0
+    for line in layout.cell_lines[cell]:
+        run = 0
+        for line_cell in line:
+            if colors[line_cell] == color or wild[line_cell]:
+                run += 1
+            else:
+                if run >= SEQUENCE_LENGTH:
+                    count += 1 + (run >= 2 * SEQUENCE_LENGTH)
+                run = 0
+        if run >= SEQUENCE_LENGTH:
+            count += 1 + (run >= 2 * SEQUENCE_LENGTH)
+    return count
+
+
+def get_card_ids():
+    # Return the IDs of the cards in a single deck.
+    # returns - list; the str card IDs
+
+    suits = ['H', 'D', 'S', 'C']
+    nums = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+    cards = []
+    for suit in suits:
+        for num in nums:
+            cards.append(num + suit)
+    return cards
+
+
+# User-defined classes
+
+class Layout:
+    # This class represents a compiled board layout.
+    # - cards: tuple of the card ID of each cell in row-major order
+    # - codes: array of the index of each cell's card in CARD_IDS
+    # - wild: array of 1 for the wild corner cells and 0 elsewhere
+    # - card_cells: dict of the cells showing each card ID
+    # - lines: every row, column and diagonal long enough to hold a sequence
+    # - cell_lines: tuple of the lines through each cell
+    # - windows: array of the cells of every line window of 5, flattened
+    # - cell_windows: tuple of the window indices that contain each cell
+    # - ref: the name of a shipped layout, or the path of any other, for load_layout to find it again
+
+    def __init__(self, name, rows, ref=None):
+        # Validate and compile a layout.
+        # self - Layout; the Layout to initialize
+        # name - str; the name of the layout
+        # rows - list; 2D list of the str card IDs of each row
+        # ref - str; the name or path that load_layout finds the layout by, or None to use the name
+
+        self.name = name
+        self.ref = ref
+        if ref is None:
+            self.ref = name
+        self.size = len(rows)
+        self.copies = 0
+        self.validate(rows)
+        self.cards = tuple(card for row in rows for card in row)
+        self.codes = array('B', [CARD_IDS.index(card) for card in self.cards])
+        self.wild = array('B', [card == 'W' for card in self.cards])
+        self.card_cells = self.create_card_cells()
+        self.lines = self.create_lines()
+        self.cell_lines = self.create_cell_lines()
+        self.windows, self.cell_windows = self.create_windows()
+
+    def validate(self, rows):
+        # Check that a layout is square, has wild corners and shows every non-jack card equally often.
+        # self - Layout; the Layout being compiled
+        # rows - list; 2D list of the str card IDs of each row
+
+        if self.size < SEQUENCE_LENGTH:
+            raise ValueError("Layout {} must have at least {} rows".format(self.name, SEQUENCE_LENGTH))
+        for row in rows:
+            if len(row) != self.size:
+                raise ValueError("Layout {} must be square".format(self.name))
+        last = self.size - 1
+        for row_ind, col_ind in [(0, 0), (0, last), (last, 0), (last, last)]:
+            if rows[row_ind][col_ind] != 'W':
+                raise ValueError("Layout {} must have wild corners".format(self.name))
+        counts = {}
+        for row in rows:
+            for card in row:
+                if card not in CARD_IDS or card[0] == 'J':
+                    raise ValueError("Layout {} has an invalid card: {}".format(self.name, card))
+                counts[card] = counts.get(card, 0) + 1
+        counts.pop('W', None)
+        self.copies = counts.get('2H', 0)
+        for card in get_card_ids():
+            if card[0] != 'J' and counts.get(card, 0) != self.copies:
+                raise ValueError("Layout {} must show every non-jack card {} times: {}".format(
+                    self.name, self.copies, card))
+        if self.copies == 0:
+            raise ValueError("Layout {} must show every non-jack card".format(self.name))
+
+    def create_card_cells(self):
+        # Create the index of the cells showing each card.
+        # self - Layout; the Layout being compiled
+        # returns - dict; tuple of cell indices for each str card ID
+
+        card_cells = {}
+        for cell, card in enumerate(self.cards):
+            card_cells.setdefault(card, [])
+            card_cells[card].append(cell)
+        for card in card_cells:
+            card_cells[card] = tuple(card_cells[card])
+        return card_cells
+
+    def create_lines(self):
+        # Create the rows, columns and diagonals that are long enough for a sequence.
+        # self - Layout; the Layout being compiled
+        # returns - tuple; a tuple of cell indices for each line
+
+        size = self.size
+        lines = []
+        for ind in range(size):
+            lines.append(tuple(ind * size + col_ind for col_ind in range(size)))
+            lines.append(tuple(row_ind * size + ind for row_ind in range(size)))
+        for start in range(-(size - SEQUENCE_LENGTH), size - SEQUENCE_LENGTH + 1):
+            down_right = []
+            down_left = []
+            for row_ind in range(size):
+                col_ind = row_ind + start
+                if 0 <= col_ind < size:
+                    down_right.append(row_ind * size + col_ind)
+                    down_left.append(row_ind * size + (size - 1 - col_ind))
+            lines.append(tuple(down_right))
+            lines.append(tuple(down_left))
+        return tuple(lines)
+
+    def create_cell_lines(self):
+        # Create the index of the lines through each cell.
+        # self - Layout; the Layout being compiled
+        # returns - tuple; a tuple of lines for each cell
+
+        cell_lines = [[] for _ in range(len(self.cards))]
+        for line in self.lines:
+            for cell in line:
+                cell_lines[cell].append(line)
+        return tuple(tuple(lines) for lines in cell_lines)
+
+    def create_windows(self):
+        # Create the table of every window of 5 cells along a line.
+        # self - Layout; the Layout being compiled
+        # returns - tuple; the flattened window array and the windows containing each cell
+
+        windows = array('H')
+        cell_windows = [[] for _ in range(len(self.cards))]
+        num_windows = 0
+        for line in self.lines:
+            for start in range(len(line) - SEQUENCE_LENGTH + 1):
+                for cell in line[start:start + SEQUENCE_LENGTH]:
+                    windows.append(cell)
+                    cell_windows[cell].append(num_windows)
+                num_windows += 1
+        return windows, tuple(tuple(indices) for indices in cell_windows)
+
+    def get_cells(self, card):
+        # Return the cells showing a card.
+        # self - Layout; the Layout object
+        # card - str; the card ID
+        # returns - tuple; the cell indices, empty for jacks
+
+        return self.card_cells.get(card, ())
+
+    def get_window(self, window_ind):
+        # Return the cells of a window.
+        # self - Layout; the Layout object
+        # window_ind - int; the index of the window
+        # returns - array; the cell indices of the window
+
+        start = window_ind * SEQUENCE_LENGTH
+        return self.windows[start:start + SEQUENCE_LENGTH]
+
+
+# The number of chips in a row that make a sequence.
+SEQUENCE_LENGTH = 5
+CARD_IDS = ['W'] + get_card_ids()
+LAYOUT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Compiled layouts by path.
+layouts = {}
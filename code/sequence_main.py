@@ -5,14 +5,25 @@
 # The code is based on the pre-poke-framework from UAlberta CMPUT 174 Fall 2020.
 # This program is for personal use only. Sequence(R) is property of Jax Ltd.
 
+import importlib
 import os
-import pygame
-import random
+import sys
+from sequence_layout import load_layout, count_sequences, get_card_ids
+from sequence_engine import setup_deck, get_num_teams, get_num_cards, get_max_sequences, NUM_CARDS
+from sequence_profile import create_profiler
 
 
 # User-defined functions
 
 def main():
+    # read the board layout and number of players named on the command line if any,
+    # before any window is opened
+    layout = 'board1'
+    if len(sys.argv) > 1:
+        layout = sys.argv[1]
+    num_players = 2
+    if len(sys.argv) > 2:
+        num_players = parse_num_players(sys.argv[2])
     # initialize all pygame modules (some need initialization)
     pygame.init()
     # create a pygame display window
@@ -21,55 +32,172 @@ def main():
     pygame.display.set_caption('Sequence')
     # get the display surface
     w_surface = pygame.display.get_surface()
+    # profile the game loop if SEQUENCE_PROFILE names a dump file
+    profiler = create_profiler()
     # create a game object
-    game = Game(w_surface)
+    game = Game(w_surface, layout, profiler, num_players)
     # start the main game loop by calling the play method on the game object
     game.play()
+    if profiler is not None:
+        profiler.dump()
     # quit pygame and clean up the pygame window
     pygame.quit()
 
 
-def load_images():
-    # Load the images associated with each card.
-    # Returns - dict; the images associated with a str card ID (unscaled)
-    suits = ['H', 'D', 'S', 'C']
-    nums = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-    images = {}
-    for suit in suits:
-        for num in nums:
-            key = num + suit
-            path = os.path.join("card_images", "{}.png".format(key))
-            image = pygame.image.load(path)
-            images[key] = image
-    images['W'] = pygame.image.load(os.path.join("card_images", "W.png"))
-    images['back'] = pygame.image.load(os.path.join("card_images", "card_back.png"))
-    return images
+def parse_num_players(text):
+    # Return the number of players given on the command line, exiting with a message if it is not supported.
+    # text - str; the command line argument
+    # returns - int; the number of players
+
+    supported = ', '.join(str(num) for num in sorted(NUM_CARDS))
+    if not text.isdigit() or get_num_cards(int(text)) is None:
+        sys.exit("Unsupported number of players: {} (choose from {})".format(text, supported))
+    return int(text)
+
+
+def get_scaled_image(images, card, size, angle=0):
+    # Return a card image rotated and scaled to a given size.
+    # The result is kept by the CardImages and shared by every Tile and Player drawing that card at that size.
+    # images - CardImages; the images associated with a str card ID (unscaled)
+    # card - str; the card ID of the image
+    # size - tuple; the width and height of the scaled image
+    # angle - int; the rotation of the image in degrees
+    # returns - pygame.Surface; the scaled image
+
+    key = (card, size, angle)
+    image = images.scaled_images.get(key)
+    if image is None:
+        image = images.get_image(card)
+        if angle != 0:
+            image = pygame.transform.rotate(image, angle)
+        image = pygame.transform.scale(image, size)
+        images.scaled_images[key] = image
+    return image
+
+
+def get_board_view(cards, board_rect, size, images, surface):
+    # Return the BoardView shared by every Board with the same layout, position, surface and images.
+    # The views are kept by the CardImages they draw, so they are freed along with its Game.
+    # cards - tuple; the card ID of each Tile in row-major order
+    # board_rect - pygame.Rect; the area of the Board
+    # size - int; the number of Tiles in each row and column
+    # images - CardImages; the images associated with each card
+    # surface - pygame.Surface; the Game window
+    # returns - BoardView; the shared geometry and images
+
+    key = (cards, tuple(board_rect), size, id(surface))
+    view = images.board_views.get(key)
+    if view is None:
+        view = BoardView(cards, board_rect, size, images, surface)
+        images.board_views[key] = view
+    return view
+
+
+def get_hand_view(num_cards, board_rect, images, surface):
+    # Return the HandView shared by every Player holding the same number of cards with the same images.
+    # num_cards - int; the number of cards in a hand
+    # board_rect - pygame.Rect; the area of the Board
+    # images - CardImages; the images associated with each card
+    # surface - pygame.Surface; the Game window
+    # returns - HandView; the shared geometry and images
+
+    key = (num_cards, tuple(board_rect), surface.get_size(), id(surface))
+    view = images.hand_views.get(key)
+    if view is None:
+        view = HandView(num_cards, board_rect, images, surface)
+        images.hand_views[key] = view
+    return view
+
 
 # User-defined classes
 
+class LazyModule:
+    # This class stands in for a module until one of its attributes is first used.
+    # The module is then imported and replaces this object in the program's globals,
+    # so the program can be imported without importing pygame.
+
+    def __init__(self, name):
+        # Initialize a LazyModule.
+        # self - LazyModule; the LazyModule to initialize
+        # name - str; the name of the module and of the global it is bound to
+
+        self.name = name
+
+    def __getattr__(self, attribute):
+        # Import the module and return one of its attributes.
+        # self - LazyModule; the LazyModule object
+        # attribute - str; the name of the attribute
+
+        module = importlib.import_module(self.name)
+        globals()[self.name] = module
+        return getattr(module, attribute)
+
+
+class CardImages:
+    # This class holds the card images, loading each from disk the first time it is needed.
+
+    def __init__(self):
+        # Initialize CardImages with no images loaded.
+        # self - CardImages; the CardImages to initialize
+
+        self.images = {}
+        # Flyweight tables: the scaled images, by card, size and angle, and the BoardViews and
+        # HandViews drawing them, by geometry and surface. They are shared by every Tile and
+        # Player, which only hold their own state, and are freed along with the CardImages.
+        self.scaled_images = {}
+        self.board_views = {}
+        self.hand_views = {}
 
-def setup_deck():
-    # Setup and return the deck.
-    # returns - list; the cards in the deck
+    def get_image(self, card):
+        # Return the image of a card, loading it if needed.
+        # self - CardImages; the CardImages object
+        # card - str; the card ID, 'W' or 'back'
+        # returns - pygame.Surface; the unscaled image
 
-    deck = []
-    suits = ['H', 'D', 'S', 'C']
-    nums = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-    for suit in suits:
-        for num in nums:
-            deck.append(num + suit)
-    deck *= 2
-    random.shuffle(deck)
-    return deck
+        image = self.images.get(card)
+        if image is None:
+            image = self.load(card)
+        return image
+
+    def load(self, card):
+        # Load the image of a card from disk.
+        # self - CardImages; the CardImages object
+        # card - str; the card ID, 'W' or 'back'
+        # returns - pygame.Surface; the unscaled image
+
+        filename = "{}.png".format(card)
+        if card == 'back':
+            filename = "card_back.png"
+        image = pygame.image.load(os.path.join(IMAGE_DIR, filename))
+        self.images[card] = image
+        return image
+
+    def is_loaded(self, card):
+        # Return True if the image of a card has been loaded.
+        # self - CardImages; the CardImages object
+        # card - str; the card ID
+
+        return card in self.images
+
+    def load_all(self):
+        # Load every card image that has not been loaded yet.
+        # self - CardImages; the CardImages object
+
+        for card in get_card_ids() + ['W', 'back']:
+            if not self.is_loaded(card):
+                self.load(card)
 
 
 class Game:
     # An object in this class represents a complete game.
 
-    def __init__(self, surface):
+    def __init__(self, surface, layout='board1', profiler=None, num_players=2):
         # Initialize a Game.
         # - self is the Game to initialize
         # - surface is the display window surface object
+        # - layout is the name or path of the board layout
+        # - profiler is the Profiler timing the game loop, or None
+        # - num_players is the number of players, a key of NUM_CARDS
 
         # === objects that are part of every game that we will discuss
         self.surface = surface
@@ -81,33 +209,47 @@ class Game:
         self.continue_game = True
 
         # === game specific objects
-        self.images_dict = load_images()
-        self.board = self.create_board()
-        self.num_players = 2
+        if get_num_cards(num_players) is None:
+            raise ValueError("Unsupported number of players: {}".format(num_players))
+        self.images_dict = CardImages()
+        self.board = self.create_board(layout)
+        self.num_players = num_players
         self.num_teams = self.get_num_teams()
-        self.deck = setup_deck()
+        self.deck = setup_deck(self.board.get_layout().copies)
         self.num_cards = self.get_num_cards()
         self.num_sequences = [0, 0, 0]
         self.max_sequences = self.get_max_sequences()
         self.turn_num = 0
+        # The seat and team to move are advanced each turn, so no turn looks at the other seats.
+        self.current_seat = 0
+        self.current_team = 0
         self.is_ready = False
         self.colors = ['blue', 'green', 'red']
         self.players = self.setup_players()
+        self.profiler = profiler
+        self.show_profile = False
+        if self.profiler is not None:
+            self.setup_profiler()
+        self.is_loading = True
         self.draw()
 
-        print(self.num_players, self.num_teams, self.num_cards)
-        print(self.deck)
-
     def play(self):
         # Play the game until the player presses the close box.
         # - self is the Game that should be continued or not.
 
         while not self.close_clicked:  # until player clicks close box
             # play frame
+            if self.is_loading:
+                self.load_next_images()
             self.handle_events()
             if self.continue_game:
                 self.update()
-            self.game_Clock.tick(self.FPS)  # run at most with FPS Frames Per Second
+            frame_ms = self.game_Clock.tick(self.FPS)  # run at most with FPS Frames Per Second
+            if self.profiler is not None:
+                self.profiler.end_frame(frame_ms)
+                if self.show_profile and self.profiler.num_frames % PROFILE_REFRESH_FRAMES == 0:
+                    self.draw_profile()
+                    pygame.display.update(self.get_profile_rect())
 
     def handle_events(self):
         # Handle each user event by changing the game state appropriately.
@@ -119,6 +261,9 @@ class Game:
                 self.close_clicked = True
             elif event.type == pygame.MOUSEBUTTONUP and self.continue_game:
                 self.handle_mouse_up(event)
+            elif event.type == pygame.KEYUP and event.key == pygame.K_F3 and self.profiler is not None:
+                self.show_profile = not self.show_profile
+                self.draw()
 
     def draw(self):
         # Draw all game objects.
@@ -127,8 +272,80 @@ class Game:
         self.surface.fill(self.bg_color)  # clear the display surface first
         self.board.draw()
         self.draw_hands()
+        if self.profiler is not None and self.show_profile:
+            self.draw_profile()
         pygame.display.update()  # make the updated surface appear on the display
 
+    def setup_profiler(self):
+        # Time the phases of the game loop and show the profile overlay.
+        # self - Game; the Game object
+
+        self.profiler.instrument(self, 'handle_events')
+        self.profiler.instrument(self, 'play_turn')
+        self.profiler.instrument(self.board, 'check_sequences')
+        self.profiler.instrument(self, 'draw')
+        for name in ['blits', 'tiles_redrawn', 'chips_drawn']:
+            self.profiler.count(name, 0)
+        # The views shared by the Tiles and Players count what is drawn as it is drawn.
+        self.board.tiles[0][0].view.profiler = self.profiler
+        self.get_current_player().view.profiler = self.profiler
+        self.profile_font = pygame.font.Font(None, 22)
+        self.show_profile = True
+
+    def get_profile_rect(self):
+        # Return the area of the profile overlay, left of the Board.
+        # self - Game; the Game object
+        # returns - pygame.Rect; the area
+
+        return pygame.Rect(0, 0, self.board.get_rect().left, self.surface.get_height())
+
+    def draw_profile(self):
+        # Draw the profile overlay over the area left of the Board.
+        # self - Game; the Game object
+
+        rect = self.get_profile_rect()
+        self.surface.fill(self.bg_color, rect)
+        y = 10
+        for line in self.profiler.get_overlay_lines():
+            text = self.profile_font.render(line, True, pygame.Color('white'))
+            self.surface.blit(text, (10, y))
+            self.profiler.count('blits')
+            y += text.get_height() + 2
+
+    def load_next_images(self):
+        # Load the next few card images and show them, starting with the current player's hand.
+        # self - Game; the Game object
+
+        cards = self.get_next_images(IMAGES_PER_FRAME)
+        if len(cards) == 0:
+            self.is_loading = False
+        hand = self.get_current_player().get_hand()
+        redraw_all = False
+        rects = []
+        for card in cards:
+            self.images_dict.load(card)
+            if card in hand or card == 'back':
+                redraw_all = True
+            else:
+                rects.extend(self.board.draw_card(card))
+        if redraw_all:
+            self.draw()
+        elif len(rects) > 0:
+            pygame.display.update(rects)
+
+    def get_next_images(self, count):
+        # Return the next card images to load: the current player's hand, then the Board in order.
+        # self - Game; the Game object
+        # count - int; the maximum number of cards to return
+        # returns - list; the str card IDs whose images are not loaded yet
+
+        hand = self.get_current_player().get_hand()
+        cards = []
+        for card in hand + ['back'] + list(self.board.get_layout().cards):
+            if len(cards) < count and card not in cards and not self.images_dict.is_loaded(card):
+                cards.append(card)
+        return cards
+
     def update(self):
         # Update the game objects for the next frame.
         # - self is the Game to update
@@ -147,14 +364,15 @@ class Game:
                 self.draw_game_over(self.colors[i])
 
         # Check Tie
-        current_player = self.players[self.turn_num % self.num_players]
+        current_player = self.get_current_player()
         if len(current_player.get_hand()) == 0 or current_player.has_moves(self.board):
             self.continue_game = False
             print("Game Over!")
 
-    def create_board(self):
+    def create_board(self, layout):
         # Create the Board object.
         # self - Game; the Game object
+        # layout - str; the name or path of the board layout
         # returns - Board; the Sequence Board
 
         board_color = pygame.Color((100, 70, 40))
@@ -162,7 +380,7 @@ class Game:
         board_pos = [0, 0]
         for axis in range(len(board_size)):
             board_pos[axis] = (self.surface.get_size()[axis] - board_size[axis]) // 2
-        board = Board(board_pos, board_size, board_color, self.images_dict, self.surface)
+        board = Board(board_pos, board_size, board_color, self.images_dict, self.surface, layout)
         return board
 
     def handle_mouse_up(self, event):
@@ -172,7 +390,7 @@ class Game:
 
         if event.button == 1:
             if self.is_ready:
-                current_player = self.players[self.turn_num % self.num_players]
+                current_player = self.get_current_player()
                 self.play_turn(event.pos, current_player)
                 card_highlighted = current_player.select(event.pos)
                 if card_highlighted is not None:
@@ -186,24 +404,21 @@ class Game:
         # self - Game; the Game object
         # returns - int; the number of teams
 
-        if self.num_players % 3 == 0:
-            return 3
-        elif self.num_players % 2 == 0:
-            return 2
-        else:
+        num_teams = get_num_teams(self.num_players)
+        if num_teams is None:
             print("Number of players must be divisible by 2 or 3.")
+        return num_teams
 
     def setup_hands(self):
         # Setup the hands of cards for each player
         # self - Game; the Game object
         # returns - list; a 2D list of str of the card IDs for each player
 
-        hands = []
-        for i in range(self.num_cards):
-            for player_ind in range(self.num_players):
-                if i == 0:
-                    hands.append([])
-                hands[player_ind].append(self.deck.pop(0))
+        # Cards are dealt from the end of the shuffled deck, which takes constant time per card.
+        hands = [[] for _ in range(self.num_players)]
+        for _ in range(self.num_cards):
+            for hand in hands:
+                hand.append(self.deck.pop())
         return hands
 
     def get_num_cards(self):
@@ -211,17 +426,7 @@ class Game:
         # self - Game; the Game object
         # returns - int; the number of cards for each player
 
-        num_cards_dict = {
-            2: 7,
-            3: 6,
-            4: 6,
-            6: 5,
-            8: 4,
-            9: 4,
-            10: 3,
-            12: 3
-        }
-        return num_cards_dict.get(self.num_players)
+        return get_num_cards(self.num_players)
 
     def is_valid_move(self, card_played, tile_played):
         # Check if a chip has been removed from a sequence
@@ -243,11 +448,7 @@ class Game:
         # self - Game; the Game object
         # returns - int; the number of sequences required
 
-        if self.num_teams == 2:
-            max_sequences = 3
-        else:
-            max_sequences = 2
-        return max_sequences
+        return get_max_sequences(self.num_teams)
 
     def setup_players(self):
         # Setup a list of the player objects.
@@ -255,19 +456,37 @@ class Game:
         # returns - list; the Player objects
 
         hands = self.setup_hands()
+        view = get_hand_view(self.num_cards, self.board.get_rect(), self.images_dict, self.surface)
         players = []
         for i in range(self.num_players):
-            player = Player(hands[i], self.board.get_rect(), self.images_dict, self.surface)
+            player = Player(hands[i], view)
             players.append(player)
         return players
 
     def draw_hands(self):
-        # Draw the hands to the screen.
+        # Draw the hand of the current player to the screen; the other hands are never shown.
+        # self - Game; the Game object
+
+        self.get_current_player().draw_turn(not self.is_ready)
+
+    def get_current_player(self):
+        # Return the Player whose turn it is.
         # self - Game; the Game object
+        # returns - Player; the current Player
+
+        return self.players[self.current_seat]
 
-        for i in range(len(self.players)):
-            if i == self.turn_num % self.num_players:
-                self.players[i].draw_turn(not self.is_ready)
+    def next_turn(self):
+        # Pass the turn to the next seat and team.
+        # self - Game; the Game object
+
+        self.turn_num += 1
+        self.current_seat += 1
+        if self.current_seat == self.num_players:
+            self.current_seat = 0
+        self.current_team += 1
+        if self.current_team == self.num_teams:
+            self.current_team = 0
 
     def play_turn(self, position, current_player):
         # Make a move when a valid Tile on the Board is clicked.
@@ -276,14 +495,14 @@ class Game:
         # current_player - Player; the Player whose turn it is
 
         current_hand = current_player.get_hand()
-        current_color = self.colors[self.turn_num % self.num_teams]
+        current_color = self.colors[self.current_team]
         tile_played = self.board.select(position, current_color, current_hand)
         if tile_played is not None:
             card_played = tile_played.get_card_played(current_hand)
             if self.is_valid_move(card_played, tile_played):
                 current_player.replace_card(card_played, self.deck)
-                self.num_sequences[self.turn_num % self.num_teams] = self.board.check_sequences(current_color)
-                self.turn_num += 1
+                self.num_sequences[self.current_team] = self.board.check_sequences(current_color)
+                self.next_turn()
                 self.is_ready = False
                 self.decide_continue()
             else:
@@ -300,17 +519,19 @@ class Game:
 class Board:
     # This class represents the Sequence Board.
 
-    def __init__(self, position, size, color, images, surface):
+    def __init__(self, position, size, color, images, surface, layout='board1'):
         # Initialize the Board.
         # self - Board; the Board to initialize
         # position - list; the x and y coordinates of the top-left corner of the Board
         # size - list; the width and height of the Board
         # color - pygame.Color; the color of the Board
-        # images - dict; the images associated with each card
+        # images - CardImages; the images associated with each card
         # surface - pygame.Surface; the Game window
+        # layout - str; the name or path of the board layout
 
         self.rect = pygame.Rect(position, size)
-        self.size = 10
+        self.layout = load_layout(layout)
+        self.size = self.layout.size
         self.color = color
         self.surface = surface
         self.images = images
@@ -326,42 +547,19 @@ class Board:
                 tile.draw()
 
     def create_tiles(self):
-        # Create the Tiles on the Board from a file.
+        # Create the Tiles on the Board from its layout.
         # self - Board; the Board object
         # Returns - list; 2D list of Tiles
 
-        filename = "board1.txt"
-        with open(filename, 'r') as in_file:
-            content = in_file.read()
-        lines = content.splitlines()
+        view = get_board_view(self.layout.cards, self.rect, self.size, self.images, self.surface)
         tiles = []
-        for i, line in enumerate(lines):
-            cards = line.split(' ')
+        for row_ind in range(self.size):
             row = []
-            for j, card in enumerate(cards):
-                tile = self.create_tile(card, i, j)
-                row.append(tile)
+            for col_ind in range(self.size):
+                row.append(Tile(view, row_ind * self.size + col_ind))
             tiles.append(row)
         return tiles
 
-    def create_tile(self, card, row_ind, col_ind):
-        # Initialize the Tiles on the Board.
-        # self - Board; the Board object
-        # card - str; the ID of the card of the Tile
-        # row_ind - int; the row index of the Tile
-        # col_ind - int; the column index of the Tile
-        # returns - Tile; the new Tile object
-
-        gap_size = 5
-        image_width = (self.rect.width - gap_size * (self.size + 1)) // self.size
-        image_height = (self.rect.height - gap_size * (self.size + 1)) // self.size
-        image = self.images[card]
-        x = col_ind * (image_width + gap_size) + self.rect.left + gap_size
-        y = row_ind * (image_height + gap_size) + self.rect.top + gap_size
-        image = pygame.transform.rotate(image, 90)
-        image = pygame.transform.scale(image, (image_width, image_height))
-        return Tile(card, image, (x, y), (image_width, image_height), self.surface)
-
     def select(self, position, color, cards):
         # Attempt to play a piece on a Tile on the Board.
         # self - Board; the Board to select
@@ -381,88 +579,36 @@ class Board:
         # color - str; the color of the team to check
         # returns - int; number of valid sequences
 
-        sequences = 0
-        for row_ind in range(self.size):
-            for col_ind in range(self.size):
-                sequences += self.check_sequence(row_ind, col_ind, color)
-        return sequences
-
-    def check_sequence(self, row_ind, col_ind, color):
-        # Count the sequences starting from the given Tile.
-        # self - Board; the Board to check
-        # row_ind - int; the row index of the Tile checked
-        # col_ind - int; the column index of the Tile checked
-        # color - str; the color of the team to check
-        # returns - int; the number of sequences formed from this Tile
-
-        right = self.check_right(row_ind, col_ind, color)
-        down = self.check_down(row_ind, col_ind, color)
-        down_right = self.check_down_right(row_ind, col_ind, color)
-        down_left = self.check_down_left(row_ind, col_ind, color)
-        directions = [right, down, down_right, down_left]
-        count = 0
-        for direction in directions:
-            if direction == 5 or direction == 10:
-                count += 1
-        return count
-
-    def check_right(self, row_ind, col_ind, color):
-        # Count the length of the series to the right of the Tile.
-        # self - Board; the Board to check
-        # row_ind - int; the row index of the Tile checked
-        # col_ind - int; the column index of the Tile checked
-        # color - str; the color of the team to check
-        # returns - int; the length of the series
-
-        if 0 <= col_ind < self.size:
-            if self.tiles[row_ind][col_ind].matches(color):
-                return 1 + self.check_right(row_ind, col_ind + 1, color)
-        return 0
+        colors = [tile.color for row in self.tiles for tile in row]
+        return count_sequences(self.layout, colors, color)
 
-    def check_down(self, row_ind, col_ind, color):
-        # Count the length of the series downward from the Tile.
-        # self - Board; the Board to check
-        # row_ind - int; the row index of the Tile checked
-        # col_ind - int; the column index of the Tile checked
-        # color - str; the color of the team to check
-        # returns - int; the length of the series
-
-        if 0 <= row_ind < self.size:
-            if self.tiles[row_ind][col_ind].matches(color):
-                return 1 + self.check_down(row_ind + 1, col_ind, color)
-        return 0
-
-    def check_down_right(self, row_ind, col_ind, color):
-        # Count the length of the series downward and to the right of the Tile.
-        # self - Board; the Board to check
-        # row_ind - int; the row index of the Tile checked
-        # col_ind - int; the column index of the Tile checked
-        # color - str; the color of the team to check
-        # returns - int; the length of the series
+    def get_rect(self):
+        # Return the pygame.Rect representing the Board.
+        # self - Board; the Board object
 
-        if 0 <= row_ind < self.size and 0 <= col_ind < self.size:
-            if self.tiles[row_ind][col_ind].matches(color):
-                return 1 + self.check_down_right(row_ind + 1, col_ind + 1, color)
-        return 0
+        return self.rect
 
-    def check_down_left(self, row_ind, col_ind, color):
-        # Count the length of the series downward and to the left of the Tile.
-        # self - Board; the Board to check
-        # row_ind - int; the row index of the Tile checked
-        # col_ind - int; the column index of the Tile checked
-        # color - str; the color of the team to check
-        # returns - int; the length of the series
+    def draw_card(self, card):
+        # Redraw the Tiles showing a card, such as when its image has loaded.
+        # self - Board; the Board to draw
+        # card - str; the card ID
+        # returns - list; the pygame.Rects of the Tiles redrawn
 
-        if 0 <= row_ind < self.size and 0 <= col_ind < self.size:
-            if self.tiles[row_ind][col_ind].matches(color):
-                return 1 + self.check_down_left(row_ind + 1, col_ind - 1, color)
-        return 0
+        rects = []
+        for cell in self.layout.get_cells(card):
+            tile = self.tiles[cell // self.size][cell % self.size]
+            # The card images have transparent corners, so the placeholder is covered first.
+            pygame.draw.rect(self.surface, self.color, tile.view.rects[cell])
+            tile.draw()
+            rects.append(tile.view.rects[cell])
+        return rects
 
-    def get_rect(self):
-        # Return the pygame.Rect representing the Board.
+    def get_layout(self):
+        # Return the compiled layout of the Board.
         # self - Board; the Board object
+        # returns - Layout; the layout
 
-        return self.rect
+        return self.layout
 
     def highlight(self, card):
         # Highlight all matching Tiles in the Board.
@@ -474,25 +620,68 @@ class Board:
                 tile.highlight(card)
 
 
+class BoardView:
+    # This class holds the geometry and images of a Board layout, shared by all of its Tiles.
+
+    __slots__ = ('cards', 'positions', 'centres', 'rects', 'images', 'card_images', 'tile_size', 'surface',
+                 'chip_radius', 'profiler')
+
+    def __init__(self, cards, board_rect, size, images, surface):
+        # Initialize a BoardView.
+        # self - BoardView; the BoardView to initialize
+        # cards - tuple; the card ID of each Tile in row-major order
+        # board_rect - pygame.Rect; the area of the Board
+        # size - int; the number of Tiles in each row and column
+        # images - CardImages; the images associated with each card
+        # surface - pygame.Surface; the Game window
+
+        gap_size = 5
+        image_width = (board_rect.width - gap_size * (size + 1)) // size
+        image_height = (board_rect.height - gap_size * (size + 1)) // size
+        self.cards = cards
+        self.positions = []
+        self.centres = []
+        self.rects = []
+        self.images = [None] * len(cards)
+        self.card_images = images
+        self.tile_size = (image_width, image_height)
+        self.surface = surface
+        # Chips cover about two thirds of a Tile's height, up to their size on the standard board.
+        self.chip_radius = min(25, round(image_height / 3))
+        self.profiler = None
+        for index, card in enumerate(cards):
+            x = (index % size) * (image_width + gap_size) + board_rect.left + gap_size
+            y = (index // size) * (image_height + gap_size) + board_rect.top + gap_size
+            self.positions.append((x, y))
+            self.centres.append((x + image_width // 2, y + image_height // 2))
+            self.rects.append(pygame.Rect(x, y, image_width, image_height))
+
+    def get_image(self, index):
+        # Return the scaled image of a Tile, or None if its card image has not been loaded yet.
+        # self - BoardView; the BoardView object
+        # index - int; the row-major index of the Tile
+        # returns - pygame.Surface; the image
+
+        image = self.images[index]
+        if image is None and self.card_images.is_loaded(self.cards[index]):
+            image = get_scaled_image(self.card_images, self.cards[index], self.tile_size, 90)
+            self.images[index] = image
+        return image
+
+
 class Tile:
-    # This class represents a Tile.
+    # This class represents a Tile. Its geometry and image are kept in the shared BoardView.
 
-    def __init__(self, card, image, position, size, surface):
+    __slots__ = ('view', 'index', 'color', 'is_highlighted', 'previous_color')
+
+    def __init__(self, view, index):
         # Initialize a Tile object.
         # self - Tile; the Tile to initialize
-        # card - str; the card ID of the Tile
-        # image - pygame.Surface; the image representing the Tile
-        # position - list; the x and y coordinates of the top-left corner of the Tile
-        # surface - pygame.Surface; the Game window
+        # view - BoardView; the shared geometry and images of the Board
+        # index - int; the row-major index of the Tile on the Board
 
-        self.card = card
-        self.image = image
-        self.pos = position
-        self.centre = [0, 0]
-        for i in range(2):
-            self.centre[i] = self.pos[i] + (size[i] // 2)
-        self.rect = pygame.Rect(position, size)
-        self.surface = surface
+        self.view = view
+        self.index = index
         self.color = None
         self.is_highlighted = False
         self.previous_color = None
@@ -501,13 +690,32 @@ class Tile:
         # Draw the Tile to screen.
         # self - Tile; the Tile to draw
 
-        self.surface.blit(self.image, self.pos)
+        view = self.view
+        image = view.get_image(self.index)
+        if image is None:
+            pygame.draw.rect(view.surface, PLACEHOLDER_COLOR, view.rects[self.index])
+        else:
+            view.surface.blit(image, view.positions[self.index])
         if self.is_highlighted:
-            pygame.draw.rect(self.surface, pygame.Color('yellow'), self.rect, width=3)
+            pygame.draw.rect(view.surface, pygame.Color('yellow'), view.rects[self.index], width=3)
             self.is_highlighted = False
         if self.color is not None:
-            pygame.draw.circle(self.surface, pygame.Color(self.color), self.centre, 25)
-            pygame.draw.circle(self.surface, pygame.Color(self.color + '4'), self.centre, 25, width=3)
+            centre = view.centres[self.index]
+            pygame.draw.circle(view.surface, pygame.Color(self.color), centre, view.chip_radius)
+            pygame.draw.circle(view.surface, pygame.Color(self.color + '4'), centre, view.chip_radius, width=3)
+        if view.profiler is not None:
+            view.profiler.count('tiles_redrawn')
+            if image is not None:
+                view.profiler.count('blits')
+            if self.color is not None:
+                view.profiler.count('chips_drawn')
+
+    def get_card(self):
+        # Return the card ID of the Tile.
+        # self - Tile; the Tile object
+        # returns - str; the card ID
+
+        return self.view.cards[self.index]
 
     def select(self, position, color, cards):
         # Check if the Tile can be played on. Update self.color and return True if so.
@@ -518,9 +726,10 @@ class Tile:
         # returns - bool; True if move was valid
 
         is_valid_move = False
-        if self.rect.collidepoint(position[0], position[1]) and self.card != 'W':
+        card = self.view.cards[self.index]
+        if self.view.rects[self.index].collidepoint(position[0], position[1]) and card != 'W':
             if self.color is None:
-                if self.card in cards or 'JC' in cards or 'JD' in cards:
+                if card in cards or 'JC' in cards or 'JD' in cards:
                     self.color = color
                     is_valid_move = True
             elif self.color != color:
@@ -535,7 +744,7 @@ class Tile:
         # self - Tile; the Tile to check
         # color - str; the color to check for a match
 
-        return self.color == color or self.card == 'W'
+        return self.color == color or self.view.cards[self.index] == 'W'
 
     def get_card_played(self, cards):
         # Return the card that was played from a hand.
@@ -549,8 +758,8 @@ class Tile:
             else:
                 card = 'JH'
         else:
-            if self.card in cards:
-                card = self.card
+            if self.get_card() in cards:
+                card = self.get_card()
             elif 'JC' in cards:
                 card = 'JC'
             else:
@@ -576,26 +785,73 @@ class Tile:
         # self - Tile; the Tile to highlight
         # card - str; the card ID to check against
 
-        if self.card == card:
+        if self.view.cards[self.index] == card:
             self.is_highlighted = True
 
 
+class HandView:
+    # This class holds the card rectangles and images of a hand, shared by all Players.
+
+    __slots__ = ('rects', 'card_size', 'images', 'surface', 'profiler')
+
+    def __init__(self, num_cards, board_rect, images, surface):
+        # Initialize a HandView.
+        # self - HandView; the HandView to initialize
+        # num_cards - int; the number of cards in a hand
+        # board_rect - pygame.Rect; the area of the Board
+        # images - CardImages; the images of cards referenced by their str ID (unscaled)
+        # surface - pygame.Surface; the Game window
+
+        self.images = images
+        self.surface = surface
+        self.rects = self.create_rects(num_cards, board_rect)
+        self.card_size = self.rects[0].size
+        self.profiler = None
+
+    def create_rects(self, num_cards, board_rect):
+        # Create the rectangles used to handle selection.
+        # self - HandView; the HandView object
+        # num_cards - int; the number of cards in a hand
+        # board_rect - pygame.Rect; the area of the Board
+        # returns - list; the rects used to show the cards
+
+        # Display cards on right with equal borders and constant gaps.
+        rects = []
+        gap_size = 10
+        card_height = (board_rect.height - 3 * gap_size) // 4
+        card_width = card_height * 2 // 3
+        border_width = (self.surface.get_width() - board_rect.right - 2 * card_width - gap_size) // 2
+        x_start = board_rect.right + border_width
+        y_start = board_rect.top
+        for i in range(num_cards):
+            x = (i % 2) * (card_width + gap_size) + x_start
+            y = (i // 2) * (card_height + gap_size) + y_start
+            rect = pygame.Rect(x, y, card_width, card_height)
+            rects.append(rect)
+        return rects
+
+    def get_image(self, card):
+        # Return the image of a card scaled to fit the hand.
+        # self - HandView; the HandView object
+        # card - str; the card ID, or 'back'
+        # returns - pygame.Surface; the scaled image
+
+        return get_scaled_image(self.images, card, self.card_size)
+
+
 class Player:
     # This class represents a sequence player. The player has a team and cards that can be displayed.
 
-    def __init__(self, cards, board_rect, images, surface):
+    __slots__ = ('cards', 'view', 'highlighted')
+
+    def __init__(self, cards, view):
         # Initialize a Player.
         # self - Player; the player to initialize
         # cards - list; contains the str card IDs of the player
-        # board - Board; the Board object
-        # images - dict; the images of cards referenced by their str ID
-        # surface - pygame.Surface;
+        # view - HandView; the shared card rectangles and images
 
         self.cards = cards
-        self.images = images
-        self.surface = surface
-        self.rects = self.create_rects(board_rect)
-        self.setup_images()
+        self.view = view
         self.highlighted = None
 
     def draw_turn(self, is_hidden):
@@ -603,16 +859,19 @@ class Player:
         # self - Player; the Player object
         # is_hidden - bool; True if the cards are hidden
 
+        view = self.view
         for ind in range(len(self.cards)):
             if is_hidden:
-                image = self.images['back']
+                image = view.get_image('back')
             else:
-                image = self.images[self.cards[ind]]
-            self.surface.blit(image, self.rects[ind].topleft)
+                image = view.get_image(self.cards[ind])
+            view.surface.blit(image, view.rects[ind].topleft)
+        if view.profiler is not None:
+            view.profiler.count('blits', len(self.cards))
         if self.highlighted is not None:
             for ind in range(len(self.cards)):
                 if self.highlighted == ind:
-                    pygame.draw.rect(self.surface, pygame.Color('yellow'), self.rects[ind], width=5)
+                    pygame.draw.rect(view.surface, pygame.Color('yellow'), view.rects[ind], width=5)
 
     def select(self, position):
         # Select a card from the Player's hand to highlight on the Board.
@@ -621,41 +880,11 @@ class Player:
         # returns - str; the card ID of the card highlighted
 
         for i in range(len(self.cards)):
-            if self.rects[i].collidepoint(position):
+            if self.view.rects[i].collidepoint(position):
                 self.highlighted = i
                 return self.cards[i]
         self.highlighted = None
 
-    def create_rects(self, board_rect):
-        # Create the rectangles used to handle selection.
-        # self - Player; the Player object
-        # board - Board; the Board object
-        # returns - list; the rects used to show the cards
-
-        # Display cards on right with equal borders and constant gaps.
-        rects = []
-        gap_size = 10
-        card_height = (board_rect.height - 3 * gap_size) // 4
-        card_width = card_height * 2 // 3
-        border_width = (self.surface.get_width() - board_rect.right - 2 * card_width - gap_size) // 2
-        x_start = board_rect.right + border_width
-        y_start = board_rect.top
-        for i in range(len(self.cards)):
-            x = (i % 2) * (card_width + gap_size) + x_start
-            y = (i // 2) * (card_height + gap_size) + y_start
-            rect = pygame.Rect(x, y, card_width, card_height)
-            rects.append(rect)
-        return rects
-
-    def setup_images(self):
-        # Reformat the images to fit the hand.
-        # self - Player; the Player object
-
-        for card in self.images.keys():
-            image = self.images.get(card)
-            image = pygame.transform.scale(image, (self.rects[0].width, self.rects[0].height))
-            self.images[card] = image
-
     def get_hand(self):
         # Return the Player's hand.
         # self - Player; the Player object
@@ -670,9 +899,10 @@ class Player:
         # deck - list; the deck to draw from
 
         old_index = self.cards.index(old_card)
-        self.cards.remove(old_card)
         if len(deck) > 0:
-            self.cards.insert(old_index, deck.pop(0))
+            self.cards[old_index] = deck.pop()
+        else:
+            del self.cards[old_index]
 
     def has_moves(self, board):
         # Return True if the Player has a move remaining; False otherwise.
@@ -683,4 +913,17 @@ class Player:
             can_move = True
 
 
-main()
+# pygame is imported the first time the game uses it.
+pygame = LazyModule('pygame')
+# The directory of the card images.
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "card_images")
+# The number of card images loaded per frame while the game starts.
+IMAGES_PER_FRAME = 4
+# The color of a Tile whose image has not been loaded yet.
+PLACEHOLDER_COLOR = (225, 220, 205)
+# The number of frames between refreshes of the profile overlay.
+PROFILE_REFRESH_FRAMES = 30
+
+
+if __name__ == '__main__':
+    main()
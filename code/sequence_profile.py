@@ -0,0 +1,185 @@
+# This module records where the game loop spends its time.
+# A Profiler wraps the methods of the objects it instruments with timers, so nothing
+# is timed or counted unless a Profiler has been created. It keeps a histogram of
+# frame times and named counters, and can dump a summary to a JSON file or append
+# one row per dump to a CSV file. The module does not use pygame.
+
+import bisect
+import csv
+import json
+import os
+import time
+
+
+# User-defined functions
+
+def create_profiler():
+    # Create a Profiler if profiling is enabled by the environment.
+    # SEQUENCE_PROFILE is the path of the .json or .csv dump file; SEQUENCE_PROFILE_INTERVAL
+    # is the number of seconds between dumps (default 10).
+    # returns - Profiler; the Profiler, or None when profiling is disabled
+
+    path = os.environ.get('SEQUENCE_PROFILE')
+    if path is None:
+        return None
+    interval = float(os.environ.get('SEQUENCE_PROFILE_INTERVAL', DUMP_INTERVAL))
+    return Profiler(path, interval)
+
+
+# User-defined classes
+
+class Profiler:
+    # This class represents the timers, counters and frame time histogram of a game.
+
+    def __init__(self, path=None, interval=10.0):
+        # Initialize a Profiler.
+        # self - Profiler; the Profiler to initialize
+        # path - str; the .json or .csv file to dump to, or None to never dump
+        # interval - float; the seconds between dumps
+
+        self.path = path
+        self.interval = interval
+        self.phases = {}
+        self.counters = {}
+        self.frame_buckets = [0] * (len(FRAME_BUCKETS) + 1)
+        self.num_frames = 0
+        self.frame_total = 0.0
+        self.frame_max = 0.0
+        self.last_frame = 0.0
+        self.start_time = time.time()
+        self.last_dump = time.perf_counter()
+
+    def instrument(self, obj, method_name, phase=None):
+        # Replace a method of an object with one that times each call.
+        # self - Profiler; the Profiler object
+        # obj - object; the object whose method is timed
+        # method_name - str; the name of the method
+        # phase - str; the name of the phase, or None to use the method name
+
+        method = getattr(obj, method_name)
+        if phase is None:
+            phase = method_name
+        stats = self.phases.setdefault(phase, [0, 0.0, 0.0])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+
+        setattr(obj, method_name, timed)
+
+    def count(self, name, amount=1):
+        # Add to a named counter.
+        # self - Profiler; the Profiler object
+        # name - str; the name of the counter
+        # amount - int; the amount to add
+
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_frame(self, frame_ms):
+        # Record the time of a frame, and dump the summary if the dump interval has passed.
+        # self - Profiler; the Profiler object
+        # frame_ms - float; the milliseconds since the previous frame
+
+        self.num_frames += 1
+        self.frame_total += frame_ms
+        self.last_frame = frame_ms
+        if frame_ms > self.frame_max:
+            self.frame_max = frame_ms
+        self.frame_buckets[bisect.bisect_right(FRAME_BUCKETS, frame_ms)] += 1
+        if self.path is not None and time.perf_counter() - self.last_dump >= self.interval:
+            self.dump()
+
+    def get_summary(self):
+        # Return a summary of everything recorded so far.
+        # self - Profiler; the Profiler object
+        # returns - dict; the frame statistics, phase timings and counters
+
+        phases = {}
+        for phase, (calls, total, longest) in self.phases.items():
+            phases[phase] = {
+                'calls': calls,
+                'total_ms': total * 1000,
+                'mean_ms': total * 1000 / calls if calls > 0 else 0.0,
+                'max_ms': longest * 1000
+            }
+        histogram = {}
+        for ind, num in enumerate(self.frame_buckets):
+            histogram[self.get_bucket_label(ind)] = num
+        return {
+            'time': time.time(),
+            'uptime_s': time.time() - self.start_time,
+            'frames': self.num_frames,
+            'mean_frame_ms': self.frame_total / self.num_frames if self.num_frames > 0 else 0.0,
+            'max_frame_ms': self.frame_max,
+            'frame_histogram_ms': histogram,
+            'phases': phases,
+            'counters': dict(self.counters)
+        }
+
+    def get_bucket_label(self, ind):
+        # Return the label of a frame time histogram bucket, such as '17-33'.
+        # self - Profiler; the Profiler object
+        # ind - int; the index of the bucket
+
+        if ind == 0:
+            return "<{}".format(FRAME_BUCKETS[0])
+        elif ind == len(FRAME_BUCKETS):
+            return ">={}".format(FRAME_BUCKETS[-1])
+        return "{}-{}".format(FRAME_BUCKETS[ind - 1], FRAME_BUCKETS[ind])
+
+    def get_overlay_lines(self):
+        # Return the lines of text shown by the in-game overlay.
+        # self - Profiler; the Profiler object
+        # returns - list; the str lines
+
+        summary = self.get_summary()
+        lines = ["frame {:.1f} ms (mean {:.1f}, max {:.1f})".format(
+            self.last_frame, summary['mean_frame_ms'], summary['max_frame_ms'])]
+        for phase, stats in summary['phases'].items():
+            lines.append("{} {:.2f} ms x{} (max {:.2f})".format(
+                phase, stats['mean_ms'], stats['calls'], stats['max_ms']))
+        for name, num in summary['counters'].items():
+            lines.append("{} {}".format(name, num))
+        return lines
+
+    def dump(self):
+        # Write the summary to the dump file: JSON files are replaced, CSV files get a new row.
+        # self - Profiler; the Profiler object
+
+        self.last_dump = time.perf_counter()
+        summary = self.get_summary()
+        if self.path.endswith('.csv'):
+            row = {
+                'time': summary['time'],
+                'frames': summary['frames'],
+                'mean_frame_ms': summary['mean_frame_ms'],
+                'max_frame_ms': summary['max_frame_ms']
+            }
+            for label, num in summary['frame_histogram_ms'].items():
+                row['frames_' + label] = num
+            for phase, stats in summary['phases'].items():
+                for key, value in stats.items():
+                    row[phase + '_' + key] = value
+            row.update(summary['counters'])
+            is_new = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='') as out_file:
+                writer = csv.DictWriter(out_file, fieldnames=list(row))
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(row)
+        else:
+            with open(self.path, 'w') as out_file:
+                json.dump(summary, out_file, indent=2)
+
+
+# The upper edges in milliseconds of the frame time histogram buckets.
+FRAME_BUCKETS = [8, 17, 33, 50, 100, 250]
+# The default number of seconds between dumps.
+DUMP_INTERVAL = 10.0
@@ -0,0 +1,214 @@
+# This program renders Sequence positions and replays to PNG files without a display.
+# The input is a JSON lines file of game records, as saved by sequence_tournament.py
+# --records, or of positions with a 'layout' and the 'chips' of each cell. Each worker
+# process draws with the Board and Tile classes of the game onto an off-screen surface
+# using the dummy SDL video driver, and loads and scales the card images once.
+# Example: python sequence_render.py records.jsonl renders --mode sheet
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+import pygame
+from sequence_main import Board, CardImages
+from sequence_engine import replay
+
+
+# User-defined functions
+
+def main():
+    # Render the records named on the command line.
+
+    args = parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    num_files = 0
+    with ProcessPoolExecutor(args.workers, initializer=setup_worker) as executor:
+        jobs = ((ind, record, args) for ind, record in enumerate(read_records(args.input)))
+        for paths in executor.map(render_record, jobs, chunksize=args.chunk):
+            num_files += len(paths)
+    print("Rendered {} files to {}".format(num_files, args.output))
+
+
+def parse_args():
+    # Parse the command line arguments.
+    # returns - argparse.Namespace; the arguments
+
+    parser = argparse.ArgumentParser(description="Render Sequence positions and replays to PNG files.")
+    parser.add_argument('input', help="JSON lines file of game records or positions")
+    parser.add_argument('output', help="directory to write the PNG files to")
+    parser.add_argument('--mode', choices=['final', 'frames', 'sheet'], default='final',
+                        help="final position, one frame per move, or one contact sheet per game")
+    parser.add_argument('--every', type=int, default=1, help="render every nth move in frames and sheet modes")
+    parser.add_argument('--scale', type=float, default=1.0, help="scale of the frames")
+    parser.add_argument('--columns', type=int, default=8, help="frames per row of a contact sheet")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk', type=int, default=8, help="records sent to a worker at a time")
+    return parser.parse_args()
+
+
+def read_records(path):
+    # Read records from a JSON lines file one at a time.
+    # path - str; the path of the file
+    # yields - dict; each record
+
+    with open(path, 'r') as in_file:
+        for line in in_file:
+            if line.strip() != '':
+                yield json.loads(line)
+
+
+def setup_worker():
+    # Initialize pygame and load the card images once in a worker process.
+
+    global worker_images
+    pygame.init()
+    worker_images = CardImages()
+    worker_images.load_all()
+
+
+def get_board(layout):
+    # Return the off-screen Board of a layout, creating it on first use in this worker.
+    # layout - str; the name or path of the layout
+    # returns - Board; the Board, drawn onto its own surface
+
+    board = worker_boards.get(layout)
+    if board is None:
+        surface = pygame.Surface(BOARD_SIZE)
+        board = Board([0, 0], BOARD_SIZE, pygame.Color(BOARD_COLOR), worker_images, surface, layout)
+        flatten_images(board)
+        worker_boards[layout] = board
+    return board
+
+
+def flatten_images(board):
+    # Replace the scaled card images of a Board with opaque copies on the board color.
+    # Blitting an opaque image is many times faster than alpha blending it, and the
+    # result is the same because the card images are always drawn on the board color.
+    # board - Board; the Board whose shared images are flattened
+
+    view = board.tiles[0][0].view
+    flattened = {}
+    for index, card in enumerate(view.cards):
+        image = flattened.get(card)
+        if image is None:
+            image = pygame.Surface(view.tile_size)
+            image.fill(board.color)
+            image.blit(view.get_image(index), (0, 0))
+            flattened[card] = image
+        view.images[index] = image
+
+
+def draw_position(board, chips, last_cell=None):
+    # Draw a position onto a Board's surface.
+    # board - Board; the Board to draw
+    # chips - list; the team index or None of each cell in row-major order
+    # last_cell - int; the cell of the last move to highlight, or None
+    # returns - pygame.Surface; the surface drawn on
+
+    for row in board.tiles:
+        for tile in row:
+            team = chips[tile.index]
+            if team is None:
+                tile.color = None
+            else:
+                tile.color = TEAM_COLORS[team]
+            tile.is_highlighted = tile.index == last_cell
+    board.draw()
+    return board.surface
+
+
+def scale_surface(surface, scale):
+    # Return a copy of a surface scaled by a factor.
+    # surface - pygame.Surface; the surface
+    # scale - float; the factor
+    # returns - pygame.Surface; the scaled copy
+
+    if scale == 1.0:
+        return surface.copy()
+    size = (int(surface.get_width() * scale), int(surface.get_height() * scale))
+    return pygame.transform.smoothscale(surface, size)
+
+
+def render_record(job):
+    # Render one record to PNG files. Runs in a worker process.
+    # job - tuple; the int index of the record, the dict record and the arguments
+    # returns - list; the str paths of the files written
+
+    ind, record, args = job
+    board = get_board(record.get('layout', 'board1'))
+    name = "game{:05d}".format(ind)
+    if 'moves' not in record:
+        return [save(draw_position(board, record['chips']), args.scale, args.output, name)]
+    paths = []
+    frames = []
+    num_moves = len(record['moves'])
+    for turn_num, move, chips in replay(record):
+        is_last = turn_num == num_moves - 1
+        if args.mode == 'final' and not is_last:
+            continue
+        if args.mode != 'final' and turn_num % args.every != 0 and not is_last:
+            continue
+        surface = draw_position(board, chips, move[1])
+        if args.mode == 'sheet':
+            frames.append(scale_surface(surface, args.scale))
+        elif args.mode == 'final':
+            paths.append(save(surface, args.scale, args.output, name))
+        else:
+            paths.append(save(surface, args.scale, args.output, "{}_{:03d}".format(name, turn_num + 1)))
+    if args.mode == 'sheet' and len(frames) > 0:
+        paths.append(save_sheet(frames, args.columns, args.output, name))
+    return paths
+
+
+def save(surface, scale, directory, name):
+    # Save a surface as a PNG file.
+    # surface - pygame.Surface; the surface
+    # scale - float; the factor to scale the surface by
+    # directory - str; the output directory
+    # name - str; the file name without extension
+    # returns - str; the path of the file
+
+    path = os.path.join(directory, name + '.png')
+    if scale != 1.0:
+        surface = scale_surface(surface, scale)
+    pygame.image.save(surface, path)
+    return path
+
+
+def save_sheet(frames, columns, directory, name):
+    # Save frames as a contact sheet, in rows of a number of columns.
+    # frames - list; the pygame.Surfaces of the frames, all the same size
+    # columns - int; the number of frames per row
+    # directory - str; the output directory
+    # name - str; the file name without extension
+    # returns - str; the path of the file
+
+    gap_size = 4
+    width, height = frames[0].get_size()
+    columns = min(columns, len(frames))
+    rows = math.ceil(len(frames) / columns)
+    sheet = pygame.Surface((columns * (width + gap_size) + gap_size, rows * (height + gap_size) + gap_size))
+    sheet.fill(pygame.Color(SHEET_COLOR))
+    for ind, frame in enumerate(frames):
+        x = (ind % columns) * (width + gap_size) + gap_size
+        y = (ind // columns) * (height + gap_size) + gap_size
+        sheet.blit(frame, (x, y))
+    return save(sheet, 1.0, directory, name)
+
+
+# The size of a rendered Board, the same as in the game window.
+BOARD_SIZE = (1200, 800)
+BOARD_COLOR = (100, 70, 40)
+SHEET_COLOR = (0, 75, 0)
+# The chip color of each team index, the same as the Game's colors.
+TEAM_COLORS = ['blue', 'green', 'red']
+# The card images and Boards of a worker process.
+worker_images = None
+worker_boards = {}
+
+
+if __name__ == '__main__':
+    main()
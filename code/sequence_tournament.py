@@ -0,0 +1,225 @@
+# This program runs a round-robin tournament between Sequence bots.
+# Every pair of bot policies plays at every number of players in NUM_CARDS, with the
+# policies swapped across the teams' seats. Games are spread over a process pool,
+# each result is written to a CSV file as soon as it finishes, and Elo ratings with
+# bootstrap confidence intervals are printed at the end.
+# Example: python sequence_tournament.py random greedy mcts:50 mcts:200 --games 20
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sequence_engine import GameState, NUM_CARDS, get_num_teams
+from sequence_bots import create_bot
+
+
+# User-defined functions
+
+def main():
+    # Run the tournament described by the command line arguments.
+
+    args = parse_args()
+    games = create_schedule(args.bots, args.players, args.games, args.seed, args.layout)
+    print("Playing {} games on {} workers".format(len(games), args.workers or os.cpu_count()))
+    results = run_games(games, args.workers, args.output, args.records)
+    ratings = compute_ratings(args.bots, results, args.bootstrap, random.Random(args.seed))
+    print_ratings(ratings)
+
+
+def parse_args():
+    # Parse the command line arguments.
+    # returns - argparse.Namespace; the arguments
+
+    parser = argparse.ArgumentParser(description="Run a round-robin tournament between Sequence bots.")
+    parser.add_argument('bots', nargs='+', help="bot policies: random, greedy, mcts or mcts:<playouts>")
+    parser.add_argument('--players', type=int, nargs='+', choices=sorted(NUM_CARDS), default=sorted(NUM_CARDS),
+                        help="numbers of players to play (default: every supported number)")
+    parser.add_argument('--games', type=int, default=10, help="games per pairing, seating and player count")
+    parser.add_argument('--layout', default='board1', help="board layout name or path")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--output', default='tournament.csv', help="CSV file of game results")
+    parser.add_argument('--records', default=None, help="JSON lines file to save the game records to")
+    parser.add_argument('--bootstrap', type=int, default=200, help="bootstrap samples for the Elo intervals")
+    return parser.parse_args()
+
+
+def create_schedule(bots, player_counts, num_games, seed, layout):
+    # Create the list of games to play.
+    # Each game seats two policies; every assignment of the pair to the teams in which
+    # both policies play is scheduled, so each policy plays from every seat.
+    # bots - list; the str bot policies
+    # player_counts - list; the int numbers of players
+    # num_games - int; the number of games for each pairing, seating and player count
+    # seed - int; the seed of the first game
+    # layout - str; the name or path of the board layout
+    # returns - list; a dict describing each game
+
+    games = []
+    for bot_a, bot_b in itertools.combinations(bots, 2):
+        for num_players in player_counts:
+            num_teams = get_num_teams(num_players)
+            for team_bots in itertools.product([bot_a, bot_b], repeat=num_teams):
+                if bot_a in team_bots and bot_b in team_bots:
+                    for _ in range(num_games):
+                        games.append({
+                            'game': len(games),
+                            'num_players': num_players,
+                            'team_bots': list(team_bots),
+                            'bot_a': bot_a,
+                            'bot_b': bot_b,
+                            'seed': seed + len(games),
+                            'layout': layout
+                        })
+    return games
+
+
+def play_game(game):
+    # Play one scheduled game between bots. Runs in a worker process.
+    # game - dict; the game description from create_schedule
+    # returns - tuple; the dict result and the dict game record
+
+    start = time.perf_counter()
+    state = GameState(game['num_players'], game['layout'], game['seed'])
+    bots = []
+    for seat in range(state.num_players):
+        spec = game['team_bots'][seat % state.num_teams]
+        bots.append(create_bot(spec, game['seed'] * 100 + seat))
+    while not state.is_over:
+        bot = bots[state.get_current_seat()]
+        state.play(bot.choose(state))
+    if state.winner is None:
+        winner_bot = ''
+        score_a = 0.5
+    else:
+        winner_bot = game['team_bots'][state.winner]
+        score_a = float(winner_bot == game['bot_a'])
+    result = {
+        'game': game['game'],
+        'num_players': game['num_players'],
+        'seed': game['seed'],
+        'bot_a': game['bot_a'],
+        'bot_b': game['bot_b'],
+        'winner_team': '' if state.winner is None else state.winner,
+        'winner_bot': winner_bot,
+        'score_a': score_a,
+        'turns': state.turn_num,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+    # One column per team, since a policy such as book:<path> can contain any separator.
+    for team, field in enumerate(TEAM_FIELDS):
+        result[field] = game['team_bots'][team] if team < state.num_teams else ''
+    return result, state.get_record()
+
+
+def run_games(games, workers, output, records):
+    # Play games over a process pool, streaming each result to CSV as it finishes.
+    # games - list; the dict game descriptions
+    # workers - int; the number of worker processes, or None for one per CPU
+    # output - str; the path of the CSV file
+    # records - str; the path of the JSON lines file for game records, or None
+    # returns - list; the dict results
+
+    results = []
+    records_file = None
+    if records is not None:
+        records_file = open(records, 'w')
+    with open(output, 'w', newline='') as out_file, ProcessPoolExecutor(workers) as executor:
+        writer = csv.DictWriter(out_file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        futures = [executor.submit(play_game, game) for game in games]
+        for future in as_completed(futures):
+            result, record = future.result()
+            writer.writerow(result)
+            out_file.flush()
+            if records_file is not None:
+                records_file.write(json.dumps(record) + '\n')
+            results.append(result)
+            print("{}/{} games".format(len(results), len(games)), end='\r')
+    if records_file is not None:
+        records_file.close()
+    print()
+    return results
+
+
+def fit_elo(bots, results):
+    # Fit Elo ratings to game results by maximum likelihood (Bradley-Terry, ties count half).
+    # bots - list; the str bot policies
+    # results - list; the dict results with bot_a, bot_b and score_a
+    # returns - dict; the Elo rating of each bot, averaging 1500
+
+    wins = {bot: 0.0 for bot in bots}
+    pair_games = {}
+    for result in results:
+        wins[result['bot_a']] += result['score_a']
+        wins[result['bot_b']] += 1 - result['score_a']
+        pair = (result['bot_a'], result['bot_b'])
+        pair_games[pair] = pair_games.get(pair, 0) + 1
+    strengths = {bot: 1.0 for bot in bots}
+    for _ in range(ELO_ITERATIONS):
+        new_strengths = {}
+        for bot in bots:
+            denominator = 0.0
+            for (bot_a, bot_b), num in pair_games.items():
+                if bot == bot_a or bot == bot_b:
+                    denominator += num / (strengths[bot_a] + strengths[bot_b])
+            # Half a win against a virtual opponent of unit strength keeps every rating finite.
+            new_strengths[bot] = (wins[bot] + 0.5) / (denominator + 1 / (strengths[bot] + 1))
+        strengths = new_strengths
+    ratings = {bot: 400 * math.log10(strengths[bot]) for bot in bots}
+    mean = sum(ratings.values()) / len(ratings)
+    return {bot: 1500 + rating - mean for bot, rating in ratings.items()}
+
+
+def compute_ratings(bots, results, num_samples, rng):
+    # Compute the Elo rating of each bot with a 95% bootstrap confidence interval.
+    # bots - list; the str bot policies
+    # results - list; the dict results
+    # num_samples - int; the number of bootstrap samples
+    # rng - random.Random; the random number generator used to resample
+    # returns - dict; the rating and the low and high ends of its interval for each bot
+
+    ratings = fit_elo(bots, results)
+    samples = {bot: [] for bot in bots}
+    for _ in range(num_samples):
+        sample = [rng.choice(results) for _ in results]
+        sample_ratings = fit_elo(bots, sample)
+        for bot in bots:
+            samples[bot].append(sample_ratings[bot])
+    intervals = {}
+    for bot in bots:
+        values = sorted(samples[bot])
+        if len(values) == 0:
+            intervals[bot] = (ratings[bot], ratings[bot], ratings[bot])
+        else:
+            low = values[int(0.025 * (len(values) - 1))]
+            high = values[int(0.975 * (len(values) - 1))]
+            intervals[bot] = (ratings[bot], low, high)
+    return intervals
+
+
+def print_ratings(ratings):
+    # Print the ratings from strongest to weakest.
+    # ratings - dict; the rating and interval of each bot
+
+    print("{:<16}{:>8}{:>18}".format("bot", "elo", "95% interval"))
+    for bot in sorted(ratings, key=lambda name: -ratings[name][0]):
+        rating, low, high = ratings[bot]
+        print("{:<16}{:>8.0f}{:>18}".format(bot, rating, "[{:.0f}, {:.0f}]".format(low, high)))
+
+
+# The columns of the CSV results file, with the policy of each of up to 3 teams.
+TEAM_FIELDS = ['team_0_bot', 'team_1_bot', 'team_2_bot']
+CSV_FIELDS = (['game', 'num_players', 'seed'] + TEAM_FIELDS +
+              ['bot_a', 'bot_b', 'winner_team', 'winner_bot', 'score_a', 'turns', 'seconds'])
+# The number of iterations used to fit the Elo ratings.
+ELO_ITERATIONS = 100
+
+
+if __name__ == '__main__':
+    main()